@@ -11,12 +11,11 @@ import math
 import queue
 import time
 from datetime import timedelta
-import copy
 
 from BaseObject import *
 from StigChopper import *
 from ApachiPos import *
-from TravSalesman import *
+from RoutePlanner import *
 
 class Apachi(StigChopper):
     startTime = time.time_ns()
@@ -24,8 +23,6 @@ class Apachi(StigChopper):
     fullTank = None
     rotAngle = 0.0
     optimalRouteIdxArr = None
-    tsmObject = None
-    tsmWps = None
     firstPack = True
 
     def __init__(self,id, pos, scale=0.2):
@@ -36,11 +33,14 @@ class Apachi(StigChopper):
         self.mainSpeed = 0.0
         self.tilt = 0.0
         self.tailSpeed = 0.0
+        self.planner = None
+        self.pathSent = False
         self.ctrl = ApachiPos(self.id,self.cruseAlt)
-        self.ctrl.db("==== STARTING APACHI ====")
+        self.ctrl.send(TelemetrySchema.START)
         #self.ctrl.sendEvent(self.ctrl.TEST_EVT)
         #self.ctrl.setPosition(Vec3(-100,-105,70))
         #self.ctrl.setPosition(Vec3(15.0,-11.00,70))
+        self.spiny = None
         self.spiny1 = None
         self.spiny2 = None
         for child in self.actor.children:
@@ -51,83 +51,54 @@ class Apachi(StigChopper):
             if not child is None:
                 if nodepath.getName() == "Rotor":
                     self.spiny = nodepath
-                self.ctrl.db("Name -- {}: {}".format((' ' * recurse_level), child.getName()))
+                self.ctrl.db("Name -- %s: %s", ' ' * recurse_level, child.getName())
                 self.findRotNodes(child, recurse_level + 1)
 
-    def findNearPos(self, myPos, wps):
-        sz = len(wps)
+    def findNearPos(self, myPos):
+        nearPos = self.waypointGrid.nearest(myPos)
         nearIdx = None
-        nearPos = None
-        pt = None
-        if sz > 0:
-            nearPos = wps[0]
-            nearIdx = 0
-            if sz > 1:
-                idx = 0
-                dist = 1e6
-                for pos in wps:
-                    deltaX = pos.x - myPos.x
-                    deltaY = pos.y - myPos.y
-                    curDistance = math.sqrt(deltaX * deltaX + deltaY * deltaY)
-                    self.ctrl.db(f" idx: {idx}, dist: {dist: 3.4f}")
-                    if self.firstPack:
-                        #print(f"wps.append(Vec3({pos.x}, {pos.y}, {pos.z}))")
-                        self.ctrl.db(f"origSet :({pos.x},{pos.y},{pos.z})|")
-                    if curDistance < dist:
-                        nearPos = pos
-                        dist = curDistance
-                        nearIdx = idx
-                        self.ctrl.db(f"New near: {dist:3.4f}, idx: {idx}")
-                    idx += 1
+        if nearPos is not None:
+            nearIdx = self.waypointGrid.indexOf(nearPos)
+            self.ctrl.db("New near: idx: %s", nearIdx)
         return nearIdx, nearPos
 
     def findNextPos(self,myPos):
-        nxtIdx, nxtPos = self.findNearPos(myPos,self.targetWaypoints)
-        #return nxtIdx, nxtPos
-        #print(f"Closes: {nxtIdx}, at {nxtPos}")
+        nxtIdx, nxtPos = None, None
         try:
-            sz = len(self.targetWaypoints)
-            if self.tsmObject is None:
-                self.tsmWps = copy.deepcopy(self.targetWaypoints)
-                lastPos = nxtPos
-                self.tsmWps.remove(nxtPos)
-                for _ in range(3):
-                    _, toElim  = self.findNearPos(lastPos,self.tsmWps)
-                    lastPos = toElim
-                    self.tsmWps.remove(toElim)
-                print(self.tsmWps)
-                self.tsmObject = TravSalesman()
-                self.tsmObject.determine(lastPos,self.tsmWps)
-            #elif sz == 8:
-            #    self.tsmWps = self.targetWaypoints[0:10]
-            #    self.tsmWps.remove(nxtPos)
-            #    self.tsmObject.determine(nxtPos,self.tsmWps)
-            elif sz <= 11 and self.tsmObject.allDone():
-                if not self.tsmObject.done:
-                    self.tsmObject.finish()
-                    for idx in range(len(self.tsmObject.idx)):
-                        pos = self.tsmWps[self.tsmObject.idx[idx]]
-                        self.ctrl.db(f"tsmpath :({pos.x},{pos.y},{pos.z})|")
-                        #print(f"tsmpath :({pos.x},{pos.y},{pos.z})|")
-                nxTmp = self.tsmObject.nextIndex()
-                if nxTmp is not None:
-                    nxtIdx = nxTmp
-                    nxtPos = self.tsmWps[nxtIdx]
+            # never wait on the route: take the best tour so far, the planner
+            # keeps improving the rest of it from runLogic
+            if self.planner is None:
+                self.planner = RoutePlanner(self.id, steps = RoutePlanner.STEPS if base.seeded else None)
+            self.planner.sync(myPos, self.targetWaypoints)
+            nxtPos = self.planner.popNext()
+            nxtIdx = None if nxtPos is None else self.waypointGrid.indexOf(nxtPos)
         except Exception as ex:  #revert to the clos
             print(f"Exception in findNexPos for next pos: {ex}")
+            nxtIdx, nxtPos = self.findNearPos(myPos)
         #print(f" nxtIDX: {nxtIdx}, at pos {nxtPos}")
         return nxtIdx, nxtPos
 
+    def planRoute(self):
+        if self.planner is None:
+            return
+        if self.planner.improve() and not self.pathSent:
+            for pos in self.planner.bestTour():
+                self.ctrl.send(TelemetrySchema.POINT, TelemetrySchema.TSM_PATH, pos.x, pos.y, pos.z)
+                #print(f"tsmpath :({pos.x},{pos.y},{pos.z})|")
+            self.pathSent = True
+
     def setWaypoints(self, wp):
         super().setWaypoints(wp)
-        self.targetWaypoints = wp
         self.cargoIdx = 0
         myPos = base.gps(self.id)
         if self.firstPack:
+            for pos in wp:
+                #print(f"wps.append(Vec3({pos.x}, {pos.y}, {pos.z}))")
+                self.ctrl.send(TelemetrySchema.POINT, TelemetrySchema.ORIG_SET, pos.x, pos.y, pos.z)
             self.cargoIdx, pt = self.findNextPos(myPos)
             if pt is not None:
                 self.ctrl.setPosition(Vec3(pt.x, pt.y, self.cruseAlt))
-                self.ctrl.db(f"packages: {len(self.targetWaypoints)},")
+                self.ctrl.send(TelemetrySchema.PACKAGES, len(self.targetWaypoints))
                 #del(self.targetWaypoints[self.cargoIdx])
                 self.firstPack = False
         if self.fullTank is None:
@@ -161,6 +132,7 @@ class Apachi(StigChopper):
         _,fp = self.getRemFuel()
         self.mainSpeed, self.tailSpeed, self.tilt = self.ctrl.tick(pos, hdng, actSpd, tailSpd, actTilt, dt, fp)
         base.requestSettings(self.id,self.mainSpeed,self.tilt,self.tailSpeed)
+        self.planRoute()
         if self.ctrl.velCtrl.state == self.ctrl.velCtrl.SIDE_ST and not self.ctrl.state == self.ctrl.HOVER_ST:
             #transition to however
             self.ctrl.sendEvent(self.ctrl.HOVER_EVT)
@@ -168,14 +140,14 @@ class Apachi(StigChopper):
             if len(self.targetWaypoints) > 0:
                 delviered = base.deliverPackage(self.id)
                 if delviered:
-                    self.ctrl.db(f"================== DELIVERED PACKAGE ===================== #{self.cargoIdx}")
+                    self.ctrl.db("================== DELIVERED PACKAGE ===================== #%d", self.cargoIdx)
                     self.cargoIdx, pt = self.findNextPos(pos)
                     if self.cargoIdx is None:
-                        self.ctrl.db(f"packages: {len(self.targetWaypoints)},")
+                        self.ctrl.send(TelemetrySchema.PACKAGES, len(self.targetWaypoints))
                         deltaT_s = pos.getW()
                         eltimeStr = timedelta(seconds=deltaT_s)
                         delStr = f"== APACHI DELIVERED ALL PACKAGES: in {eltimeStr}/ {deltaT_s}, returning to base..."
-                        self.ctrl.db(f"DEBUG1 {delStr},")
+                        self.ctrl.send(TelemetrySchema.DEBUG, 1, delStr)
                         print(delStr,flush=True)
                         if self.homeBase is not None:
                             self.ctrl.setPosition(Vec3(self.homeBase.x, self.homeBase.y, self.cruseAlt))
@@ -188,10 +160,10 @@ class Apachi(StigChopper):
                             self.ctrl.sendEvent(self.ctrl.GO_EVT)
                         else:
                             self.ctrl.velCtrl.sendEvent(self.ctrl.velCtrl.IDLE_EVT)
-                        self.ctrl.db(f"packages: {len(self.targetWaypoints)},")
+                        self.ctrl.send(TelemetrySchema.PACKAGES, len(self.targetWaypoints))
                         #del(self.targetWaypoints[self.cargoIdx])
                 else:
-                    self.ctrl.db(f"======= TRYING TO DROP OFF =========== #{self.cargoIdx}")
+                    self.ctrl.db("======= TRYING TO DROP OFF =========== #%d", self.cargoIdx)
             else:
                 self.ctrl.db("Shutting down main rotor...")
                 self.ctrl.altCtrl.sendEvent(self.ctrl.altCtrl.STOP_EVT)
@@ -201,5 +173,5 @@ class Apachi(StigChopper):
         fuel = base.myChoppers[self.id][1].remainingFuel_kg
         if self.fullTank is not None:
             fuelPercent = fuel / self.fullTank * 100.0
-        self.ctrl.db(f"REMFUEL: {fuel:2.1f} kg ({fuelPercent:2.1f}%),")
+        self.ctrl.send(TelemetrySchema.FUEL, fuel, fuelPercent)
         return fuel,fuelPercent
\ No newline at end of file
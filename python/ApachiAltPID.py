@@ -5,7 +5,6 @@
 from panda3d.core import Vec3, Vec4
 
 import math
-import queue
 import inspect
 import time
 
@@ -26,9 +25,6 @@ class ApachiAlt(BaseStateMachine):
     ROTOR_STARTED_EVT = 252
     STOP_EVT = 253
 
-    eventQ = queue.Queue()
-    leave = None
-    handle = None
 
     trg = 0.0
     act = 0.0
@@ -45,7 +41,6 @@ class ApachiAlt(BaseStateMachine):
     
     dt = 0
     state = GND_ST
-    firstTick = True
     
     lastUpdate = time.time_ns()
 
@@ -133,10 +128,9 @@ class ApachiAlt(BaseStateMachine):
     def dump(self,source):
         now = time.time_ns()
         if (now - self.dumpTime) >= 5e8:
-            self.db(f"{source:10}, ApachiAltPID alttrg: {self.trg: 3.4f}, altact: {self.act: 3.4f}, "\
-                    f"alttrgrate: {self.trgRate: 3.9f}, altactrate: {self.altRate: 3.9f}, altaccel: {self.accel:3.9f},"\
-                    f"error: {self.error: 3.9f}, integral: {self.integral: 3.8f}, deriv: {self.derivitive: 3.8f},TOS:{self.takeOffSpd:>+4.1f}, "\
-                    f"act rot: {self.actMainSpd: 3.4f}, des rot: {self.desRotSpd: 3.4f},")
+            self.send(TelemetrySchema.ALT, source, self.trg, self.act, self.trgRate, self.altRate, self.accel,
+                      self.error, self.integral, self.derivitive, self.takeOffSpd,
+                      self.actMainSpd, self.desRotSpd)
             self.dumpTime = now
         pass
 
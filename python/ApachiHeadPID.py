@@ -5,7 +5,6 @@
 from panda3d.core import Vec2
 
 import math
-import queue
 import inspect
 import time
 from BaseStateMachine import *
@@ -26,13 +25,9 @@ class ApachiHead(BaseStateMachine):
     trg = 0.0
     act = 0.0
 
-    eventQ = queue.Queue()
     
-    leave = None
-    handle = None
     
     state = AT_HEAD_ST
-    firstTick = True
     lastUpdate = time.time_ns()
 
     ##Relative kick - works
@@ -65,8 +60,8 @@ class ApachiHead(BaseStateMachine):
         if (now - self.dumpTime) > 5e8:
             try:
                 dH = self.getError()
-                self.db(f"{source:10} ApachiHeadPID trg: {self.trg: 3.4f}, act: {self.act: 3.4f}, dA: {dH: 3.4f}, desRS: {self.desRotSpd: 3.4f}, " \
-                        f"actRotSpd: {self.actRotSpd: 3.4}, int: {self.integral: 3.9f}, der: {self.derivitive: 3.9f}, dt: {self.dt: 3.4f}, elapsed: {self.alt: 3.4f},")
+                self.send(TelemetrySchema.HEAD, source, self.trg, self.act, dH, self.desRotSpd, self.actRotSpd,
+                          self.integral, self.derivitive, self.dt, self.alt)
             except:
                 pass
             self.dumpTime = now
@@ -5,7 +5,6 @@
 from panda3d.core import Vec3, Vec4
 
 import math
-import queue
 import inspect
 import time
 from BaseStateMachine import *
@@ -45,23 +44,11 @@ class ApachiPos(BaseStateMachine):
     MAX_ACCEL = 0.088 #empricially defined
     MIN_ACCEL = 0.0001 # not to divied by zero
 
-    eventQ = queue.Queue()
-    leave = None
-    handle = None
     
     dt = 0
     lastStamp = time.time_ns()
     lastChange = lastStamp
     state = INIT_ST
-    firstTick = True
-
-    curPos = Vec3(0, 0, 0)
-    prevPos = Vec3(0, 0, 0)
-    trgPos = Vec3(0, 0, 0)
-
-    altCtrl = ApachiAlt()
-    headCtrl = ApachiHead()
-    velCtrl = ApachiVel()
 
     decelDist = 1000.0
 
@@ -80,7 +67,6 @@ class ApachiPos(BaseStateMachine):
     testVelStamp = time.time_ns()
     dropOffAlt = 0.0
 
-    sock = None
 
     Kp = 0.02
     Ki = 0.000001
@@ -102,19 +88,16 @@ class ApachiPos(BaseStateMachine):
 
     dumpTime = time.time_ns()
 
-    def pv(self, w, v):
-        return f"{w:6}:({v.x: 3.4f}, {v.y: 3.4f}, {v.z: 3.4f})|"
-
     def dump(self,source):
         now = time.time_ns()
         if (now - self.dumpTime) > 5e8:
-            cp = self.pv("cur", self.curPos)
-            tp = self.pv("trg", self.trgPos)
+            cp = self.curPos
+            tp = self.trgPos
             dp = self.calcDistToTarget()
             try:
-                self.db(f"{source:10}, {cp}, {tp}, dist: {dp:3.4f},facing: {self.velCtrl.facing:3.4f},"\
-                        f"head: {self.velCtrl.velocityHeading:3.4f}, speed: {self.velCtrl.speed: 3.8f},"\
-                        f"maxAccel: {self.maxAccel: 3.4f}, trgHdg: {self.trgHdg: 3.4f}")
+                self.send(TelemetrySchema.POS, source, cp.x, cp.y, cp.z, tp.x, tp.y, tp.z, dp,
+                          self.velCtrl.facing, self.velCtrl.velocityHeading, self.velCtrl.speed,
+                          self.maxAccel, self.trgHdg)
             except:
                 pass
             self.dumpTime = now
@@ -131,7 +114,7 @@ class ApachiPos(BaseStateMachine):
             self.db(f"Self lifted off...")
             self.sendEvent(self.GO_EVT)
         else:
-            self.db(f"Waiting to lift off...")
+            self.db("Waiting to lift off...", prio = TelemetryChannel.LOW)
 
     def inAltChgHndl(self):
         self.maxAccel = self.MIN_ACCEL
@@ -173,7 +156,7 @@ class ApachiPos(BaseStateMachine):
             what = "Not stopped, go to hover"
             #self.sendEvent(self.HOVER_EVT)
         
-        self.db(f"{what}> headT: {trgHdg:3.4f}, actH: {self.headCtrl.act:3.4f}, rate: {turnRt:3.4f}, dist: {dist:3.4f}")
+        self.db("%s> headT: %3.4f, actH: %3.4f, rate: %3.4f, dist: %3.4f", what, trgHdg, self.headCtrl.act, turnRt, dist, prio = TelemetryChannel.LOW)
 
     def outTurnHndl(self):
         pass
@@ -215,7 +198,7 @@ class ApachiPos(BaseStateMachine):
                 #time to decelerate
                 self.sendEvent(self.DECEL_EVT)
                 what = "DONE. Start Decelerating "
-        self.db(f"{what}> distR: {distR:3.4f}, prevD: {self.deltaPos: 3.4f}, halfway: {self.decelDist:3.4f}, stopDist: {stopDist:3.4f}")
+        self.db("%s> distR: %3.4f, prevD: % 3.4f, halfway: %3.4f, stopDist: %3.4f", what, distR, self.deltaPos, self.decelDist, stopDist, prio = TelemetryChannel.LOW)
 
     def inDecelHndl(self):
         self.velCtrl.setSpeed(0.0)
@@ -258,7 +241,7 @@ class ApachiPos(BaseStateMachine):
         '''
         self.db(f"{what}> distT: {distR:3.4f}, prevD: {self.deltaPos: 3.4f}, "\
                 f"speed: {self.velCtrl.speed:3.4f}, tilt: {self.velCtrl.actTilt:3.4f},  "\
-                f"hdg: {self.headCtrl.act:3.4f}, trgHdg: {desHdg:3.4f}, noSpd: {lowSpd}, noTilt: {noTilt},")
+                f"hdg: {self.headCtrl.act:3.4f}, trgHdg: {desHdg:3.4f}, noSpd: {lowSpd}, noTilt: {noTilt},", TelemetryChannel.LOW)
         '''
 
     def inDecHndl(self):
@@ -331,7 +314,7 @@ class ApachiPos(BaseStateMachine):
         elif faceFwd and stable and atHead and isIdle:
             wh += " setting zero speed"
             self.velCtrl.setSpeed(0.0)
-        self.db(f"{wh} faceFwd: {faceFwd}, stable: {stable}, stopped: {stopped}, atHdg: {atHead} idl: {isIdle},")
+        self.db("%s faceFwd: %s, stable: %s, stopped: %s, atHdg: %s idl: %s,", wh, faceFwd, stable, stopped, atHead, isIdle, prio = TelemetryChannel.LOW)
 
     def aprHndl(self):
         landed = self.isLanded()
@@ -430,6 +413,14 @@ class ApachiPos(BaseStateMachine):
         super().__init__("ApachiPos",0x10)
         self.state = self.INIT_ST
         self.id = id
+        self.curPos = Vec3(0, 0, 0)
+        self.prevPos = Vec3(0, 0, 0)
+        self.trgPos = Vec3(0, 0, 0)
+        self.altCtrl = ApachiAlt()
+        self.headCtrl = ApachiHead()
+        self.velCtrl = ApachiVel()
+        for ctrl in (self.altCtrl, self.headCtrl, self.velCtrl):
+            ctrl.id = id
         self.startStamp = time.time_ns()
         self.crusalt = crusAlt
 
@@ -554,7 +545,7 @@ class ApachiPos(BaseStateMachine):
         else:
             atTime = False
 
-        self.db(f" {moreAlts} and {inTol} and {atAlt}")
+        self.db(" %s and %s and %s", moreAlts, inTol, atAlt, prio = TelemetryChannel.LOW)
         if self.idxAlt == 0:
             #self.velCtrl.setSpeed(0.4)
             self.altCtrl.setTarget(alts[self.idxAlt])
@@ -581,7 +572,7 @@ class ApachiPos(BaseStateMachine):
         else:
             atTime = False
 
-        self.db(f" atVel: {atVel}, inTol: {inTol}, moreVels: {moreVels}, atTime: {atTime}")
+        self.db(" atVel: %s, inTol: %s, moreVels: %s, atTime: %s", atVel, inTol, moreVels, atTime, prio = TelemetryChannel.LOW)
         newVal = None
         if moreVels: newVal = vals[self.idxVel]
         
@@ -591,14 +582,14 @@ class ApachiPos(BaseStateMachine):
             elif self.altCtrl.act > 0.03 * self.altCtrl.trg:
                 self.velCtrl.setSpeed(vals[self.idxVel])
                 self.idxVel += 1
-                self.db(f"Set initial velocity {newVal: 3.4f} ======================================= ")
+                self.db("Set initial velocity % 3.4f ======================================= ", newVal)
         elif atVel and inTol and moreVels and atTime:
             if newVal < -50.0:
                 #turn an go
                 self.headCtrl.setHeading(45)
                 newVal = 0.34
             self.velCtrl.setSpeed(newVal)
-            self.db(f"Set next velocity {newVal: 3.4f} ======================================= {newVal:3.4f} ")
+            self.db("Set next velocity % 3.4f ======================================= %3.4f ", newVal, newVal)
             self.idxVel += 1
             self.testVelStamp = None
         
@@ -613,7 +604,7 @@ class ApachiPos(BaseStateMachine):
         moreVals = idx < len(vals)
         inTol = abs(self.headCtrl.getError()) <= self.headCtrl.tol
         atHead = self.headCtrl.state == self.headCtrl.AT_HEAD_ST
-        self.db(f" more: {moreVals}, intol: {inTol}, atHead: {atHead}")
+        self.db(" more: %s, intol: %s, atHead: %s", moreVals, inTol, atHead, prio = TelemetryChannel.LOW)
 
         if idx == 0:
             #self.velCtrl.setSpeed(0.4)
@@ -642,7 +633,7 @@ class ApachiPos(BaseStateMachine):
         else:
             atTime = False
 
-        self.db(f" NEXT: more: {moreVals}, tol: {inTol} t: {atTime}")
+        self.db(" NEXT: more: %s, tol: %s t: %s", moreVals, inTol, atTime, prio = TelemetryChannel.LOW)
         if idx == 0:
             if self.altCtrl.trg < 30:
                 self.altCtrl.setTarget(67)
@@ -8,7 +8,6 @@ import socket
 import struct
 from threading import Thread
 import queue
-import re as RegEx
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 import datetime
@@ -16,6 +15,8 @@ import math
 import random
 from datetime import timedelta
 import numpy
+from TelemetryChannel import splitRecords
+import TelemetrySchema
 
 #https://stackoverflow.com/questions/603852/how-do-you-udp-multicast-in-python
 MCAST_GRP = '224.0.0.1'
@@ -29,6 +30,7 @@ class ApachiTelem:
     queue = queue.Queue()
     thread = None
     quit = False
+    dropped = 0
     def __init__(self):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -136,57 +138,23 @@ class ApachiTelem:
         while True:
             if self.quit: break
             try:
-                data, addr = self.sock.recvfrom(1024)
+                data, addr = self.sock.recvfrom(2048)
             except socket.error as e:
                 print(f"Exception: {e}")
             else:
-                dataStr = data.decode()
-                self.queue.put(dataStr)
+                try:
+                    recs = splitRecords(data)
+                except (ValueError, struct.error, KeyError) as ex:
+                    # stray traffic on the group, or another schema version
+                    self.dropped += 1
+                    print(f"Dropped datagram {self.dropped} from {addr}: {ex}")
+                    continue
+                for rec in recs:
+                    self.queue.put(rec)
                 #print(dataStr)
 
-    def getData(self,key,msg, endCh = ',',cap = None):
-          bIdx = msg.find(key)
-          eIdx = msg.find(endCh,bIdx+1)
-          res = msg[bIdx:eIdx]
-          if cap is not None:
-            res = RegEx.sub(key,cap,res)
-          res = res.upper()
-          res = f"{res:<45}"
-          return res
-    
-    def getDatFloat(self,key,msg,endCh = ',',cap = None):
-        regEx = f".*{key}(.*?){endCh}.*"
-        ms = RegEx.match(regEx,msg)
-        if ms is not None:
-            valStr = ms.group(1)
-        else:
-            valStr = "0.001"
-            print(f"NOT FOUND msg: {msg}, ms: {ms.group(1)} regex: {regEx}")
-        try:
-            val = float(valStr)
-        except:
-            val = 0.0
-            print(f"NOT A FLOAT msg: {msg}, ms: {ms.group(1)} regex: {regEx}")
-        return val
-
-    def getXY(self,which,msg):
-        ms = RegEx.match(f".*{which}[ ]*:.(.*?),(.*?),(.*?).|.*",msg)
-        x = 0.0
-        y = 0.0
-        if ms is not None:
-            try:
-                xStr = ms.group(1)
-                yStr = ms.group(2)
-                x = float(xStr)
-                y = float(yStr)
-                #print(f" x = {x}, y = {y}")
-            except Exception as ex:
-                x = 0.0
-                y = 0.0
-                print(f" NOT A FLOAT {xStr} or {yStr} in {msg}: {ex}")
-        return x,y
-
-    
+    def label(self, text):
+        return f"{text.upper():<45}"
 
     def str2State(self, which, statStr):
         match(int(statStr)):
@@ -224,107 +192,76 @@ class ApachiTelem:
         try:
             while not self.queue.empty():
                 if self.quit: break
-                msg = self.queue.get()
-                stI = msg.find(">")
-                dI = msg.find("dist:")
-                fI = msg.find("facing:")
-                elT = msg.find("elapsed:")
-                altDes = msg.find("desRS:") #in heading state
-                accI = msg.find("velaccel:")
-                accSpdI = msg.find("velactT") #in velocity state
-                altStI = msg.find("alttrg:") #in altitude state
-                altI = msg.find("ApachiAltPID")
-                velSpdI = msg.find("velspd:")
-                pkgI = msg.find("packages: ")
-                dbg1 = msg.find("DEBUG1:")
-                dbg2 = msg.find("DEBUG2:")
-                headI = msg.find("ApachiHeadPID")
-                fuelI = msg.find("REMFUEL")
+                hdr, data = self.queue.get()
+                kind = hdr.type
                 floatVal1 = None; fact1 = None
                 floatVal2 = None; fact2 = None
                 floatVal3 = None; fact3 = None
                 floatVal4 = None; fact4 = None
-                if msg.find("==== STARTING APACHI ====") >= 0:
+                if kind == TelemetrySchema.START:
                     self.pos1 = [[0,0]]
                     self.pos2 = [[0,0]]
                     self.pos3 = [[0,0]]
                     self.p3First = True
-                if pkgI >= 0:
-                    self.pkgs["text"] = self.getData("packages: ",msg,",")
-                if fuelI >= 0:
-                    fStr = self.getData("REMFUEL:",msg,",","FUEL: ")
-                    self.fuel["text"] = fStr
-                    try:
-                        ms = RegEx.match(".*\\((.*)%.*",fStr)
-                        if ms is not None and ms.group(1) is not None:
-                            self.fuelG.set_value(float(ms.group(1)))
-                    except: pass
-                if dI >= 0 and fI >=0:
-                    self.dist["text"] = self.getData("dist:",msg,',',"DISTANCE:")
-                    self.face["text"] = self.getData("facing:",msg)
-                    self.head["text"] = self.getData("head:",msg)
-                    self.speed["text"] = self.getData("speed:",msg)
-                    self.spdG.set_value(10.0 * self.getDatFloat("speed:",msg,","))
-                    statStr = msg[:(stI)]
-                    self.posState["text"] = self.str2State("POS STATE",statStr)
-                    self.cp["text"] = self.getData("cur   :",msg,"|","CUR POS:")
-                    self.ap["text"] = self.getData("trg   :",msg,"|","TRG POS:")
-                    self.headTrg["text"] = self.getData("trgHdg:",msg," [","TRG HGD:")
-                    cX,cY = self.getXY("cur",msg)
+                elif kind == TelemetrySchema.PACKAGES:
+                    self.pkgs["text"] = self.label(f"packages: {data.count}")
+                elif kind == TelemetrySchema.FUEL:
+                    self.fuel["text"] = self.label(f"FUEL: {data.remaining_kg:2.1f} kg ({data.percent:2.1f}%)")
+                    self.fuelG.set_value(data.percent)
+                elif kind == TelemetrySchema.POS:
+                    self.dist["text"] = self.label(f"DISTANCE: {data.dist:3.4f}")
+                    self.face["text"] = self.label(f"facing: {data.facing:3.4f}")
+                    self.head["text"] = self.label(f"head: {data.head:3.4f}")
+                    self.speed["text"] = self.label(f"speed: {data.speed: 3.8f}")
+                    self.spdG.set_value(10.0 * data.speed)
+                    self.posState["text"] = self.str2State("POS STATE",hdr.state)
+                    self.cp["text"] = self.label(f"CUR POS:({data.curX: 3.4f}, {data.curY: 3.4f}, {data.curZ: 3.4f})")
+                    self.ap["text"] = self.label(f"TRG POS:({data.trgX: 3.4f}, {data.trgY: 3.4f}, {data.trgZ: 3.4f})")
+                    self.headTrg["text"] = self.label(f"TRG HGD: {data.trgHdg: 3.4f}")
                     p1 = self.pos1[-1]
-                    x1 = p1[0]
-                    y1 = p1[1]
-                    dx = (cX - x1)
-                    dy = (cY - y1)
+                    dx = (data.curX - p1[0])
+                    dy = (data.curY - p1[1])
                     dist = math.sqrt(dx * dx + dy * dy)
                     if dist > 0.5:
-                        self.pos1.append([cX,cY])
-                if msg.find("origSet") >= 0:
-                    oX,oY = self.getXY("origSet",msg)
-                    self.pos2.append([oX,oY])
-                if msg.find("tsmpath") >= 0:
-                    pX,pY = self.getXY("tsmpath",msg)
-                    if self.p3First:
-                        self.pos3 = []
-                        self.p3First = False
-                    self.pos3.append([pX,pY])
-                if accI >= 0 and accSpdI >= 0:
-                      self.accel["text"] = self.getData("accel:",msg)
-                      state = msg[:stI]
-                      self.vState["text"] = self.str2State("VEL STATE",state)
-                if elT >= 0 and altDes >= 0:
-                      state = msg[:stI]
-                      self.hState["text"] = self.str2State("HDG STATE",state)
-                      secsFlt = self.getDatFloat("elapsed:",msg,",")
-                      secsInt = int(secsFlt)
-                      secFmtStr = str(timedelta(seconds = secsInt))
-                      self.elTime["text"] = f"Elapsed: {secFmtStr:>08}"
-                if altI >= 0:
-                    state = msg[:stI]
-                    self.altState["text"] = self.str2State("ALT STATE",state)
-                    self.alt["text"] = self.getData("altact:",msg,",","alt:") + "/" + self.getData("alttrg:",msg,",","") 
-                    self.altG.set_value(1.0 * self.getDatFloat("altact:",msg,","))
-                    self.accel["text"] = self.getData("altaccel:",msg,",","ALT ACCEL:")
-                if False: #velSpdI >= 0: #velocity
-                    floatVal1 = self.getDatFloat("veltrg:",msg,","); fact1 = 100.0 #trg speed yellow
-                    floatVal2 = self.getDatFloat("velspd:",msg,","); fact2 = 100.0 #act speed green
-                    floatVal3 = self.getDatFloat("err:",msg,","); fact3 = 100.0 #vel error red 
-                    floatVal4 = self.getDatFloat("velactT:",msg,","); fact4 = .10 #tilt blue
-                if False: #headI >= 0: #heading graphs
-                    floatVal1 = self.getDatFloat("trg: ",msg,","); fact1 = 0.1
-                    floatVal2 = self.getDatFloat("act: ",msg,","); fact2 = 0.1
-                    floatVal3 = self.getDatFloat("actRotSpd: ",msg,","); fact3 = 0.03
-                    floatVal4 = self.getDatFloat("dA: ",msg,","); fact4 = 5.0
-                if altI >= 0: #altitude
-                    floatVal1 = self.getDatFloat("alttrg: ",msg,","); fact1 = 0.1
-                    floatVal2 = self.getDatFloat("altact: ",msg,","); fact2 = 0.1
-                    floatVal3 = self.getDatFloat("act rot: ",msg,","); fact3 = 0.03
-                    floatVal4 = self.getDatFloat("error: ",msg,","); fact4 = 1.0
-                    
-                if dbg1 >= 0:
-                    self.dbg1["text"] = self.getData("DEBUG1:",msg)
-                if dbg2 >= 0:
-                    self.dbg2["text"] = self.getData("DEBUG2:",msg)
+                        self.pos1.append([data.curX,data.curY])
+                elif kind == TelemetrySchema.POINT:
+                    if data.kind == TelemetrySchema.ORIG_SET:
+                        self.pos2.append([data.x,data.y])
+                    else:
+                        if self.p3First:
+                            self.pos3 = []
+                            self.p3First = False
+                        self.pos3.append([data.x,data.y])
+                elif kind == TelemetrySchema.VEL:
+                    self.vState["text"] = self.str2State("VEL STATE",hdr.state)
+                    if False: #velocity
+                        floatVal1 = data.trg; fact1 = 100.0 #trg speed yellow
+                        floatVal2 = data.speed; fact2 = 100.0 #act speed green
+                        floatVal3 = data.error; fact3 = 100.0 #vel error red 
+                        floatVal4 = data.actTilt; fact4 = .10 #tilt blue
+                elif kind == TelemetrySchema.HEAD:
+                    self.hState["text"] = self.str2State("HDG STATE",hdr.state)
+                    secFmtStr = str(timedelta(seconds = int(data.elapsed)))
+                    self.elTime["text"] = f"Elapsed: {secFmtStr:>08}"
+                    if False: #heading graphs
+                        floatVal1 = data.trg; fact1 = 0.1
+                        floatVal2 = data.act; fact2 = 0.1
+                        floatVal3 = data.actRotSpd; fact3 = 0.03
+                        floatVal4 = data.dA; fact4 = 5.0
+                elif kind == TelemetrySchema.ALT:
+                    self.altState["text"] = self.str2State("ALT STATE",hdr.state)
+                    self.alt["text"] = self.label(f"alt: {data.act: 3.4f}/{data.trg: 3.4f}")
+                    self.altG.set_value(data.act)
+                    self.accel["text"] = self.label(f"ALT ACCEL: {data.accel:3.9f}")
+                    floatVal1 = data.trg; fact1 = 0.1
+                    floatVal2 = data.act; fact2 = 0.1
+                    floatVal3 = data.actRotSpd; fact3 = 0.03
+                    floatVal4 = data.error; fact4 = 1.0
+                elif kind == TelemetrySchema.DEBUG:
+                    if data.slot == 1:
+                        self.dbg1["text"] = self.label(data.text)
+                    else:
+                        self.dbg2["text"] = self.label(data.text)
                 added = False
                 if floatVal1 is not None:
                     self.ydata1.append(floatVal1 * fact1); added = True
@@ -5,7 +5,6 @@
 from panda3d.core import Vec2, Vec3
 
 import math
-import queue
 import inspect
 import time
 from BaseStateMachine import *
@@ -39,13 +38,9 @@ class ApachiVel(BaseStateMachine):
     actPos = None
     lstPos = None
 
-    eventQ = queue.Queue()
     
-    leave = None
-    handle = None
     
     state = CHANGE_ST
-    firstTick = True
     lastUpdate = time.time_ns()
     
     ##stable kick
@@ -78,12 +73,9 @@ class ApachiVel(BaseStateMachine):
         now = time.time_ns()
         if (now - self.dumpTime) > 5e8:
             try:
-                self.db(f"{source:5}, ApachVelPID T:{self.dt: 2.1f},veltrg:{self.trg: 3.6f},velspd:{self.speed: 3.9f}, "\
-                        f"desT:{self.desTilt: 3.4f},velactT:{self.actTilt: 3.6f}, "\
-                        f"err:{self.error: 3.9f},I:{self.integral: 3.9f},D:{self.derivitive: 3.9f}, "\
-                        f"F:{self.facing: 3.4f},M:{self.velocityHeading: 3.4f} "\
-                        f"lp:({lp.x: 3.4f},{lp.y: 3.4f},{lp.z: 3.4f}),cp:({cp.x: 3.4f},{cp.y: 3.4f},{cp.z: 3.4f})"\
-                        f"dir:({pDiff.x: 3.4f},{pDiff.y: 3.4f},{pDiff.z: 3.4f})")
+                self.send(TelemetrySchema.VEL, source, self.dt, self.trg, self.speed, self.desTilt, self.actTilt,
+                          self.error, self.integral, self.derivitive, self.facing, self.velocityHeading,
+                          lp.x, lp.y, lp.z, cp.x, cp.y, cp.z, pDiff.x, pDiff.y, pDiff.z)
             except:
                 pass
             self.dumpTime = now
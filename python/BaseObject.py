@@ -8,10 +8,21 @@ from panda3d.core import CollisionSphere, CollisionNode
 
 
 class BaseObject():
-    def __init__(self, pos, modelName, anims, colliderName):
+    def __init__(self, pos, modelName, anims, colliderName, model = None, parent = None):
         #self.actor = Actor(modelName, anims)
-        self.actor = loader.loadModel(modelName)
-        self.actor.reparentTo(render)
+        if parent is None:
+            parent = render
+        if base.headless:
+            # nothing is drawn, an empty node keeps the transforms
+            self.actor = parent.attachNewNode(modelName)
+        elif model is not None:
+            # a shared, already loaded model: this object only gets a
+            # placement node with an instance of it underneath
+            self.actor = parent.attachNewNode(modelName)
+            model.instanceTo(self.actor)
+        else:
+            self.actor = loader.loadModel(modelName)
+            self.actor.reparentTo(parent)
         self.actor.setPos(pos)
         # Note the "colliderName"--this will be used for
         # collision-events, later...
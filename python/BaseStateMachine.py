@@ -2,19 +2,19 @@
 
 # (c) 2015-2024, A Beloussov, D. Lafuze
 
-import queue
+import collections
 import inspect
 import time
-import socket
 import struct
 import math
 from panda3d.core import Vec2
+from TelemetryChannel import TelemetryChannel
+import TelemetrySchema
 
 #https://stackoverflow.com/questions/603852/how-do-you-udp-multicast-in-python
 MCAST_GRP = '224.0.0.1'
 MCAST_PORT = 50001
 IS_ALL_GROUPS = True
-MULTICAST_TTL = 2
 
 class BaseStateMachine:
 
@@ -29,7 +29,8 @@ class BaseStateMachine:
     RESET_EVT = 2
     ERROR_EVT = 3
 
-    sock = None
+    telem = None
+    id = 0
 
     def initHndl(self):
         self.db("In Init state")
@@ -61,26 +62,78 @@ class BaseStateMachine:
         },
     }
     '''
+    # Filled in by compileTables() when a subclass is created: Transitions is
+    # indexed by [state - stateBase][evt - eventBase] and holds
+    # (newState, evtHndl, enter, handle, leave) or None.
+    Transitions = None
+    stateBase = 0
+    eventBase = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "StateMachine" in cls.__dict__ or "StateHandlers" in cls.__dict__:
+            cls.compileTables()
+
+    @classmethod
+    def compileTables(cls):
+        name = cls.__name__
+        handlers = cls.StateHandlers
+        machine = cls.StateMachine
+        for st, hndls in handlers.items():
+            if not isinstance(st, int):
+                raise TypeError(f"{name}: state {st!r} is not an int")
+            if len(hndls) != 3 or not all(h is None or callable(h) for h in hndls):
+                raise TypeError(f"{name}: StateHandlers[{st}] must be (enter, handle, leave) callables or None")
+        events = set()
+        for st, evtMap in machine.items():
+            if st not in handlers:
+                raise ValueError(f"{name}: state {st} has transitions but no StateHandlers entry")
+            for evt, (newState, evtHndl) in evtMap.items():
+                if not isinstance(evt, int):
+                    raise TypeError(f"{name}: event {evt!r} in state {st} is not an int")
+                if newState not in handlers:
+                    raise ValueError(f"{name}: event {evt} in state {st} goes to state {newState} with no StateHandlers entry")
+                if evtHndl is not None and not callable(evtHndl):
+                    raise TypeError(f"{name}: event handler for {st}/{evt} is not callable")
+                events.add(evt)
+        if "state" in cls.__dict__ and cls.state not in handlers:
+            raise ValueError(f"{name}: initial state {cls.state} has no StateHandlers entry")
+        cls.stateBase = min(handlers)
+        cls.eventBase = min(events) if events else 0
+        numEvents = max(events) - cls.eventBase + 1 if events else 0
+        table = [None] * (max(handlers) - cls.stateBase + 1)
+        for st in handlers:
+            row = [None] * numEvents
+            for evt, (newState, evtHndl) in machine.get(st, {}).items():
+                row[evt - cls.eventBase] = (newState, evtHndl) + tuple(handlers[newState])
+            table[st - cls.stateBase] = row
+        cls.Transitions = table
+
     def __init__(self, TAG, DBG):
         self.db(f"Initialied Generic State Machine for tag {TAG}")
         self.TAG = TAG
         self.DBG_MASK = DBG
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+        self.telem = TelemetryChannel.get(MCAST_PORT, MCAST_GRP)
+        # per instance: the event queue is only touched from the sim thread
+        self.eventQ = collections.deque()
+        self.leave = None
+        self.handle = None
+        self.firstTick = True
 
     def sendEvent(self,evt):
-        self.eventQ.put(evt)
-        self.db(f"Sent event: {evt}, queue empty: {self.eventQ.empty()}")
+        self.eventQ.append(evt)
+        self.db(f"Sent event: {evt}, queue empty: {not self.eventQ}")
         
     def next(self):
-        while not self.eventQ.empty():
-            evt = self.eventQ.get()
+        table = self.Transitions
+        while self.eventQ:
+            evt = self.eventQ.popleft()
             #self.db(f"processing evt: {evt}")
-            stMap = self.StateMachine[self.state]
-            newState = self.state
-            if evt in stMap:
-                newState, evtHndl = stMap[evt]
-                enter, handle, leave = self.StateHandlers[newState]
+            row = table[self.state - self.stateBase]
+            evtIdx = evt - self.eventBase
+            tx = row[evtIdx] if 0 <= evtIdx < len(row) else None
+            if tx is not None:
+                newState, evtHndl, enter, handle, leave = tx
                 if newState != self.state or self.firstTick:
                     #self.db(f"State TX: {self.state}: {evt} -> {newState}")
                     if self.leave is not None:
@@ -109,17 +162,36 @@ class BaseStateMachine:
         self.dt = dt
         self.lastStamp = now
 
-    def db(self, msg):
-        msg = f"{self.state}> {msg}"
-        try:
-            if self.sock is not None:
-                self.sock.sendto(msg.encode(), (MCAST_GRP, MCAST_PORT))
-        except Exception as ex:
-            print(f"BaseStateMachine:db() -> Exception sending: {ex}")
+    def send(self, recType, *fields, prio = TelemetryChannel.HIGH):
+        if self.telem is not None:
+            self.telem.post(TelemetrySchema.encode(recType, self.id, self.state, TelemetrySchema.worldTime(), *fields), prio)
+
+    def dbgOn(self):
         try:
-            base.dbg(self.TAG,msg,self.DBG_MASK)
-        except:
-            print(msg)
+            return base.dbgOn(self.DBG_MASK)
+        except NameError:
+            # no world to ask, print everything
+            return True
+
+    def db(self, msg, *args, prio = TelemetryChannel.HIGH):
+        # msg is a %-style format string for args, or a callable returning
+        # the text, and is only built if it goes somewhere: LOW priority
+        # chatter from the per-tick handlers is debug output, sent and
+        # printed only while DBG_MASK is on
+        debug = self.dbgOn()
+        if prio == TelemetryChannel.LOW and not debug:
+            return
+        if callable(msg):
+            msg = msg()
+        elif args:
+            msg = msg % args
+        self.send(TelemetrySchema.TEXT, msg, prio = prio)
+        if debug:
+            msg = f"{self.state}> {msg}"
+            try:
+                base.dbg(self.TAG,msg,self.DBG_MASK)
+            except:
+                print(msg)
 
     
     def getDot(self,h1,h2):
@@ -12,11 +12,40 @@ from StigChopper import *
 
 
 class BuildingCluster(BaseObject):
-    def __init__(self,clID,pos,scale=0.35):
-        BaseObject.__init__(self,pos,f"Models/BuildingCluster{clID}", {}, f"bldClst")
+    '''
+    One of the four cluster models placed in the city. Each model is loaded
+    and flattened once into a prototype; every building is a placement node
+    with an instance of its prototype, so startup time and memory don't grow
+    with the number of buildings.
+    '''
+    SCALE = 0.35
+
+    prototypes = {}
+
+    @classmethod
+    def prototype(cls, clID):
+        # None when headless, nothing is drawn then
+        if base.headless:
+            return None
+        model = cls.prototypes.get(clID)
+        if model is None:
+            model = loader.loadModel(f"Models/BuildingCluster{clID}")
+            model.setHpr(0,0,0)
+            #TODO: this flattens all buildings, remove this if collissions don't work
+            model.clearModelNodes()
+            model.flattenStrong()
+            cls.prototypes[clID] = model
+        return model
+
+    @classmethod
+    def clearPrototypes(cls):
+        for model in cls.prototypes.values():
+            model.removeNode()
+        cls.prototypes = {}
+
+    def __init__(self,clID,pos,scale=SCALE,parent=None):
+        BaseObject.__init__(self,pos,f"Models/BuildingCluster{clID}", {}, f"bldClst", self.prototype(clID), parent)
+        self.clID = clID
         self.actor.setScale(scale,scale,scale)
         self.actor.setPos(pos)
         self.actor.setHpr(0,0,0)
-        #TODO: this flattens all buildings, remove this if collissions don't work
-        self.actor.clearModelNodes()
-        self.actor.flattenStrong()
\ No newline at end of file
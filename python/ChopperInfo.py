@@ -7,46 +7,89 @@ from panda3d.core import Vec3, Vec4
 import math
 import random
 
+from FleetPhysics import FleetPhysics
+
+
+def fleetColumn(name):
+    # attribute stored in this chopper's row of a FleetPhysics column
+    def getter(self):
+        return getattr(self.fleet, name)[self.row]
+    def setter(self, value):
+        getattr(self.fleet, name)[self.row] = value
+    return property(getter, setter)
+
 
 class ChopperInfo:
-    def __init__(self, id, fuelCap, startPos, startHeading):
-        self.TAG = "ChopperInfo"
-        self.CI_DBG = 0x20000000
-        self.THRUST_PER_RPM = 11.1111 # N (kg * m/s^2)
-        self.MAX_MAIN_ROTOR_SPEED = 400.0 # RPM
-        self.EARTH_ACCELERATION = 9.80665 # m/s^2
-        self.MAX_TAIL_ROTOR_SPEED = 120.0 # RPM
-        self.STABLE_TAIL_ROTOR_SPEED = 100.0 # RPM
-        self.MIN_TAIL_ROTOR_SPEED = 80.0 # RPM
-        self.MAX_TILT_MAGNITUDE = 10.0 # Degrees
-        self.MAX_MAIN_ROTOR_DELTA = 60.0 # RPM per Second
-        self.MAX_TAIL_ROTOR_DELTA = 30.0 # RPM per Second
-        self.MAX_TILT_DELTA = 3.0 # Degrees per second
-        self.FUEL_PER_REVOLUTION = 1.0 / 60.0 # Liters
-        self.ROTATION_PER_TAIL_RPM = 3.0 # degrees per second
+    TAG = "ChopperInfo"
+    CI_DBG = FleetPhysics.CI_DBG
+    THRUST_PER_RPM = FleetPhysics.THRUST_PER_RPM
+    MAX_MAIN_ROTOR_SPEED = FleetPhysics.MAX_MAIN_ROTOR_SPEED
+    EARTH_ACCELERATION = FleetPhysics.EARTH_ACCELERATION
+    MAX_TAIL_ROTOR_SPEED = FleetPhysics.MAX_TAIL_ROTOR_SPEED
+    STABLE_TAIL_ROTOR_SPEED = FleetPhysics.STABLE_TAIL_ROTOR_SPEED
+    MIN_TAIL_ROTOR_SPEED = FleetPhysics.MIN_TAIL_ROTOR_SPEED
+    MAX_TILT_MAGNITUDE = FleetPhysics.MAX_TILT_MAGNITUDE
+    MAX_MAIN_ROTOR_DELTA = FleetPhysics.MAX_MAIN_ROTOR_DELTA
+    MAX_TAIL_ROTOR_DELTA = FleetPhysics.MAX_TAIL_ROTOR_DELTA
+    MAX_TILT_DELTA = FleetPhysics.MAX_TILT_DELTA
+    FUEL_PER_REVOLUTION = FleetPhysics.FUEL_PER_REVOLUTION
+    ROTATION_PER_TAIL_RPM = FleetPhysics.ROTATION_PER_TAIL_RPM
 
+    # All state lives in the fleet arrays, this object is a view of one row
+    mainRotorPosition_Degrees = fleetColumn("mainRotorPosition_Degrees") # This is needed to draw the rotor
+    tailRotorPosition_Degrees = fleetColumn("tailRotorPosition_Degrees") # This is needed to draw the rotor
+    actMainRotorSpeed_RPM = fleetColumn("actMainRotorSpeed_RPM")
+    actTailRotorSpeed_RPM = fleetColumn("actTailRotorSpeed_RPM")
+    actTilt_Degrees = fleetColumn("actTilt_Degrees")
+    desMainRotorSpeed_RPM = fleetColumn("desMainRotorSpeed_RPM")
+    desTailRotorSpeed_RPM = fleetColumn("desTailRotorSpeed_RPM")
+    desTilt_Degrees = fleetColumn("desTilt_Degrees")
+    remainingFuel_kg = fleetColumn("remainingFuel_kg")
+    cargoMass_kg = fleetColumn("cargoMass_kg")
+    heading_Degrees = fleetColumn("heading_Degrees")
+    # In meters per second squared
+    accX_ms2 = fleetColumn("accX_ms2")
+    accY_ms2 = fleetColumn("accY_ms2")
+    accZ_ms2 = fleetColumn("accZ_ms2")
+    # In meters per second
+    velX_ms = fleetColumn("velX_ms")
+    velY_ms = fleetColumn("velY_ms")
+    velZ_ms = fleetColumn("velZ_ms")
+    # In meters, W is the time of the last update
+    posX_m = fleetColumn("posX_m")
+    posY_m = fleetColumn("posY_m")
+    posZ_m = fleetColumn("posZ_m")
+    posW_s = fleetColumn("posW_s")
+    m_revs_sum = fleetColumn("m_revs_sum")
+    m_burnt_sum = fleetColumn("m_burnt_sum")
+    m_time_sum = fleetColumn("m_time_sum")
+
+    def __init__(self, id, fuelCap, startPos, startHeading, fleet = None):
+        if fleet is None:
+            fleet = FleetPhysics(base.CHOPPER_BASE_MASS)
+        self.fleet = fleet
         self.chopperID = id
-        self.mainRotorPosition_Degrees = 0.0 # This is needed to draw the rotor
-        self.tailRotorPosition_Degrees = 0.0 # This is needed to draw the rotor
-        
-        self.actMainRotorSpeed_RPM = 0.0
-        self.actTailRotorSpeed_RPM = 0.0
-        self.actTilt_Degrees = 0.0
-        self.desMainRotorSpeed_RPM = 0.0
-        self.desTailRotorSpeed_RPM = 0.0
-        self.desTilt_Degrees = 0.0
-        self.remainingFuel_kg = fuelCap
-        self.takenOff = False
-        # In meters per second squared
-        self.actAcceleration_ms2 = Vec3(0.0, 0.0, 0.0)
-        # In meters per second
-        self.actVelocity_ms = Vec3(0.0, 0.0, 0.0)
-        # In meters
-        self.actPosition_m = Vec4(startPos.getX(), startPos.getY(), startPos.getZ(),0.0)
-        self.heading_Degrees = startHeading
-        self.m_revs_sum = 0.0
-        self.m_burnt_sum = 0.0
-        self.m_time_sum = 0.0
+        self.row = fleet.addChopper(id, fuelCap, startPos, startHeading)
+
+    @property
+    def takenOff(self):
+        return bool(self.fleet.takenOff[self.row])
+
+    @takenOff.setter
+    def takenOff(self, value):
+        self.fleet.takenOff[self.row] = value
+
+    @property
+    def actAcceleration_ms2(self):
+        return Vec3(self.accX_ms2, self.accY_ms2, self.accZ_ms2)
+
+    @property
+    def actVelocity_ms(self):
+        return Vec3(self.velX_ms, self.velY_ms, self.velZ_ms)
+
+    @property
+    def actPosition_m(self):
+        return Vec4(self.posX_m, self.posY_m, self.posZ_m, self.posW_s)
 
     def getFuelRemaining(self):
         return self.remainingFuel_kg
@@ -102,7 +145,7 @@ class ChopperInfo:
             
         
         # 1 RPM = 6 degrees per second
-        base.dbg(self.TAG, "Chopper {}, Actual Rotor Speed: {:.2f}, Desired Rotor Speed: {:.2f}".format(self.chopperID, self.actMainRotorSpeed_RPM, self.desMainRotorSpeed_RPM), self.CI_DBG)
+        base.dbg(self.TAG, "Chopper %s, Actual Rotor Speed: %.2f, Desired Rotor Speed: %.2f", self.CI_DBG, self.chopperID, self.actMainRotorSpeed_RPM, self.desMainRotorSpeed_RPM)
         self.mainRotorPosition_Degrees += self.actMainRotorSpeed_RPM * elapsedTime * 60.0
         while (self.mainRotorPosition_Degrees >= 360.0):
             self.mainRotorPosition_Degrees -= 360.0 # Just for drawing
@@ -215,12 +258,7 @@ class ChopperInfo:
         self.updateMainRotorSpeed(elapsedTime)
         self.updateTailRotorSpeed(elapsedTime)
         self.updateTiltLevel(elapsedTime)
-        cargoMass_kg = 0.0
-        thisChopper = base.getChopper(self.chopperID)
-        if (thisChopper is not None):
-            cargoMass_kg = base.ITEM_WEIGHT * thisChopper.itemCount()
-        
-        totalMass_kg = cargoMass_kg + self.remainingFuel_kg + base.CHOPPER_BASE_MASS
+        totalMass_kg = self.cargoMass_kg + self.remainingFuel_kg + self.fleet.baseMass_kg
         downForce_N = totalMass_kg * self.EARTH_ACCELERATION # F = mA
         actTilt_radians = math.radians(self.actTilt_Degrees)
         liftForce_N = self.actMainRotorSpeed_RPM * self.THRUST_PER_RPM * math.cos(actTilt_radians)
@@ -230,56 +268,56 @@ class ChopperInfo:
         deltaForce_N = liftForce_N - downForce_N
         if (deltaForce_N > 0.0): # We have enough force to ascend
             # We know vertical force, we'll compute lateral forces next
-            self.actAcceleration_ms2.setZ(deltaForce_N / totalMass_kg)
+            self.accZ_ms2 = deltaForce_N / totalMass_kg
             if (self.takenOff == False):
-                base.dbg(self.TAG,f"Chopper {self.chopperID} has lifted off!",self.CI_DBG)
+                base.dbg(self.TAG,"Chopper %s has lifted off!",self.CI_DBG, self.chopperID)
                 self.takenOff = True
         else: 
             # Simple landing check when close to zero
-            if (self.actPosition_m.getZ() < 0.25):
-                lateralMagnitude = self.actVelocity_ms.getXy().length()
-                base.dbg(self.TAG, "Chopper {} Landing check lateral velocity: {:.2f} (Limit 0.25), Vert: {:.2f} [-0.0 to -2.0]".format(self.chopperID, lateralMagnitude, self.actVelocity_ms.getZ()), self.CI_DBG)
-                if (lateralMagnitude < 0.25 and (self.actVelocity_ms.getZ() > (-2.0) and self.actVelocity_ms.getZ() < 0)):
+            if (self.posZ_m < 0.25):
+                lateralMagnitude = math.hypot(self.velX_ms, self.velY_ms)
+                base.dbg(self.TAG, "Chopper %s Landing check lateral velocity: %.2f (Limit 0.25), Vert: %.2f [-0.0 to -2.0]", self.CI_DBG, self.chopperID, lateralMagnitude, self.velZ_ms)
+                if (lateralMagnitude < 0.25 and (self.velZ_ms > (-2.0) and self.velZ_ms < 0)):
                     if (self.takenOff == True):
-                        base.dbg(self.TAG,f"Chopper {self.chopperID} has landed!",self.CI_DBG)
+                        base.dbg(self.TAG,"Chopper %s has landed!",self.CI_DBG, self.chopperID)
                     self.takenOff = False
                 
             
             if (self.takenOff == True):
-                self.actAcceleration_ms2.setZ( deltaForce_N / totalMass_kg )
+                self.accZ_ms2 = deltaForce_N / totalMass_kg
             else: 
-                self.actAcceleration_ms2.setZ(0.0)
-                self.actVelocity_ms.setZ(0.0)
-                self.actPosition_m.setZ(0.0)
+                self.accZ_ms2 = 0.0
+                self.velZ_ms = 0.0
+                self.posZ_m = 0.0
             
         if (self.takenOff): # Tail rotor comes into play
             self.updateCurrentHeading(elapsedTime)
             # Now that we have our heading, we can compute the direction of our thrust
             heading_radians = math.radians(self.heading_Degrees)
-            self.actAcceleration_ms2.setX(lateralAcceleration * math.cos(heading_radians))
-            self.actAcceleration_ms2.setY(lateralAcceleration * math.sin(heading_radians))
+            self.accX_ms2 = lateralAcceleration * math.cos(heading_radians)
+            self.accY_ms2 = lateralAcceleration * math.sin(heading_radians)
         else: 
             # For now, we're preventing skating -- chopper sliding along the ground
-            self.actAcceleration_ms2.setX(0.0)
-            self.actAcceleration_ms2.setY(0.0)
-            self.actVelocity_ms.setX(0.0)
-            self.actVelocity_ms.setY(0.0)
+            self.accX_ms2 = 0.0
+            self.accY_ms2 = 0.0
+            self.velX_ms = 0.0
+            self.velY_ms = 0.0
         
         # now that accurate acceleration is computed, we can compute new velocity
-        self.actVelocity_ms.setX((self.actVelocity_ms.getX() + self.actAcceleration_ms2.getX() * elapsedTime))
-        self.actVelocity_ms.setY((self.actVelocity_ms.getY() + self.actAcceleration_ms2.getY() * elapsedTime))
-        self.actVelocity_ms.setZ((self.actVelocity_ms.getZ() + self.actAcceleration_ms2.getZ() * elapsedTime))
+        self.velX_ms += self.accX_ms2 * elapsedTime
+        self.velY_ms += self.accY_ms2 * elapsedTime
+        self.velZ_ms += self.accZ_ms2 * elapsedTime
         # Now that accurate velocity is computed, we can update position
-        self.actPosition_m.addX((self.actVelocity_ms.getX() * elapsedTime))
-        self.actPosition_m.addY((self.actVelocity_ms.getY() * elapsedTime))
-        self.actPosition_m.addZ((self.actVelocity_ms.getZ() * elapsedTime))
-        self.actPosition_m.setW(currentTime)
+        self.posX_m += self.velX_ms * elapsedTime
+        self.posY_m += self.velY_ms * elapsedTime
+        self.posZ_m += self.velZ_ms * elapsedTime
+        self.posW_s = currentTime
 	
     def onGround(self,):
         return not self.takenOff
 	
     def show(self, curTime):
-        base.dbg(self.TAG,f"Heading: {self.heading_Degrees} deg, desired rotor speed: {self.desMainRotorSpeed_RPM}",self.CI_DBG)
+        base.dbg(self.TAG,"Heading: %s deg, desired rotor speed: %s",self.CI_DBG, self.heading_Degrees, self.desMainRotorSpeed_RPM)
         #World.dbg(self.TAG,"World Time: " + curTime + ", Acceleration: " + self.actAcceleration_ms2.info(),self.CI_DBG)
         #World.dbg(self.TAG,"Actual Heading: " + self.heading_Degrees + " Degrees, Velocity: " + self.actVelocity_ms.info(),self.CI_DBG)
         #World.dbg(self.TAG,"Actual Tilt: " + self.actTilt_Degrees + " Degrees, Position: " + self.actPosition_m.info(),self.CI_DBG)
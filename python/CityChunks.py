@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import math
+
+from panda3d.core import Geom, GeomNode, GeomTriangles, GeomVertexData, GeomVertexFormat
+from panda3d.core import GeomVertexWriter, LODNode, NodePath, Point3, Vec3
+
+from BuildingCluster import BuildingCluster
+
+def makeBox(name, lo, hi, color):
+    # a closed-top box from lo to hi, no bottom face: the far LOD of a building
+    vdata = GeomVertexData(name, GeomVertexFormat.getV3n3c4(), Geom.UHStatic)
+    vertex = GeomVertexWriter(vdata, "vertex")
+    normal = GeomVertexWriter(vdata, "normal")
+    colour = GeomVertexWriter(vdata, "color")
+    prim = GeomTriangles(Geom.UHStatic)
+    faces = (((1, 0, 0), [(1, 0, 0), (1, 1, 0), (1, 1, 1), (1, 0, 1)]),
+             ((-1, 0, 0), [(0, 1, 0), (0, 0, 0), (0, 0, 1), (0, 1, 1)]),
+             ((0, 1, 0), [(1, 1, 0), (0, 1, 0), (0, 1, 1), (1, 1, 1)]),
+             ((0, -1, 0), [(0, 0, 0), (1, 0, 0), (1, 0, 1), (0, 0, 1)]),
+             ((0, 0, 1), [(0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]))
+    for idx, (nrm, corners) in enumerate(faces):
+        for cx, cy, cz in corners:
+            vertex.addData3f(hi.x if cx else lo.x, hi.y if cy else lo.y, hi.z if cz else lo.z)
+            normal.addData3f(*nrm)
+            colour.addData4f(*color)
+        row = idx * 4
+        prim.addVertices(row, row + 1, row + 2)
+        prim.addVertices(row, row + 2, row + 3)
+    geom = Geom(vdata)
+    geom.addPrimitive(prim)
+    node = GeomNode(name)
+    node.addGeom(geom)
+    return NodePath(node)
+
+def geometryBytes(nodePath):
+    # vertex and index data under nodePath, the bulk of a chunk's memory
+    total = 0
+    for path in nodePath.findAllMatches("**/+GeomNode"):
+        for geom in path.node().getGeoms():
+            vdata = geom.getVertexData()
+            total += sum(vdata.getArray(idx).getDataSizeBytes() for idx in range(vdata.getNumArrays()))
+            total += sum(geom.getPrimitive(idx).getDataSizeBytes() for idx in range(geom.getNumPrimitives()))
+    return total
+
+class CityChunk:
+    '''
+    The buildings of one square of the city. What gets drawn is a copy of
+    every building's prototype flattened into one GeomNode (a Geom per
+    cluster model), under an LODNode that swaps it for flat shaded boxes
+    farther out and draws nothing past FAR_DIST. build() makes that from the
+    placements alone, under the chunk's own root and off the scene graph,
+    and only copies the shared prototypes. placeBuildings() then makes the
+    BuildingCluster objects, whose nodes for positions and colliders sit
+    under a hidden node: hidden, not stashed, so the collision traverser
+    still sees the colliders. Each of those instances a prototype, which
+    changes the prototype's parents, so it runs on the main thread like
+    everything else that does.
+    '''
+    # nodes, collider and Python object of one building, roughly
+    BUILDING_BYTES = 2048
+
+    def __init__(self, key, center):
+        self.key = key
+        self.center = center
+        # (clID, pos) of every building, the objects come with placeBuildings()
+        self.placements = []
+        self.buildings = []
+        self.landings = []
+        self.root = NodePath(f"chunkRoot{key}")
+        self.source = self.root.attachNewNode(f"chunkSource{key}")
+        # hide() keeps the instances out of rendering only, collisions
+        # still walk this subtree
+        self.source.hide()
+        self.nodePath = None
+        self.numBytes = 0
+
+    def add(self, clID, pos):
+        self.placements.append((clID, pos))
+
+    def placeBuildings(self):
+        # main thread only, see above
+        for clID, pos in self.placements[len(self.buildings):]:
+            self.buildings.append(BuildingCluster(clID, pos, parent = self.source))
+
+    def build(self, nearDist, farDist):
+        # (re)make the drawn geometry from the placements in the chunk
+        self.clearGeometry()
+        if not self.placements or base.headless:
+            return
+        lod = LODNode(f"chunk{self.key}")
+        lod.setCenter(Point3(self.center[0], self.center[1], 0))
+        self.nodePath = self.root.attachNewNode(lod)
+        near = self.nodePath.attachNewNode("near")
+        far = self.nodePath.attachNewNode("far")
+        for clID, pos in self.placements:
+            for copy in (BuildingCluster.prototype(clID).copyTo(near), CityChunks.proxy(clID).copyTo(far)):
+                copy.setPosHprScale(pos, Vec3(0, 0, 0), Vec3(BuildingCluster.SCALE))
+        near.flattenStrong()
+        far.flattenStrong()
+        lod.addSwitch(nearDist, 0.0)
+        lod.addSwitch(farDist, nearDist)
+        self.numBytes = len(self.placements) * self.BUILDING_BYTES + geometryBytes(self.nodePath)
+
+    def clearGeometry(self):
+        if self.nodePath is not None:
+            self.nodePath.removeNode()
+            self.nodePath = None
+        self.numBytes = len(self.placements) * self.BUILDING_BYTES
+
+    def cleanUp(self):
+        for bld in self.buildings:
+            bld.cleanUp()
+        self.buildings = []
+        self.clearGeometry()
+        self.root.removeNode()
+
+class CityChunks:
+    '''
+    The city split into CHUNK_BLOCKS x CHUNK_BLOCKS squares of city blocks,
+    so rendering walks one LOD node per chunk instead of a node per
+    building; each chunk's bounds make frustum culling work per chunk.
+    Chunks are made from the scenario's layout arrays, only the loaded ones
+    have BuildingCluster objects and scene nodes. prepare() builds a chunk's
+    geometry off the scene graph and only reads the shared prototypes and
+    proxies, so it can run on a loader thread once warmUp() has made them
+    all; attach() makes the buildings and, like unload(), changes the scene
+    and the prototypes' parents, so both belong on the main thread.
+    Bigger chunks mean fewer nodes but coarser culling: with the follow
+    camera down among the buildings, 8x8 blocks drew so much off-screen
+    geometry that frame rate halved, 4x4 kept it level.
+    '''
+    TAG = "CityChunks"
+
+    CHUNK_BLOCKS = 4
+    NEAR_DIST = 800.0
+    FAR_DIST = 3000.0
+    PROXY_COLOR = (0.55, 0.55, 0.6, 1.0)
+
+    proxies = {}
+
+    @classmethod
+    def proxy(cls, clID):
+        # a box the size of the cluster model, built once per model
+        box = cls.proxies.get(clID)
+        if box is None:
+            lo, hi = BuildingCluster.prototype(clID).getTightBounds()
+            box = makeBox(f"proxy{clID}", lo, hi, cls.PROXY_COLOR)
+            cls.proxies[clID] = box
+        return box
+
+    @classmethod
+    def clearProxies(cls):
+        for box in cls.proxies.values():
+            box.removeNode()
+        cls.proxies = {}
+
+    def __init__(self, parent, scenario, chunkBlocks = CHUNK_BLOCKS):
+        self.parent = parent
+        self.scenario = scenario
+        self.chunkBlocks = chunkBlocks
+        self.chunkSize = scenario.SPACING * chunkBlocks
+        nx, ny = scenario.cells.shape
+        self.shape = (-(-nx // chunkBlocks), -(-ny // chunkBlocks))
+        self.chunks = {}
+
+    def keyOf(self, x, y):
+        i, j = self.scenario.cellOf(x, y)
+        return (i // self.chunkBlocks, j // self.chunkBlocks)
+
+    def centerOf(self, key):
+        # middle of the chunk's blocks, in world coordinates
+        half = 0.5 * (self.chunkBlocks - 1)
+        return (self.scenario.originX + self.scenario.SPACING * (key[0] * self.chunkBlocks + half),
+                self.scenario.originY + self.scenario.SPACING * (key[1] * self.chunkBlocks + half))
+
+    def keysNear(self, points, radius):
+        # every chunk whose centre is within radius of one of points
+        keys = set()
+        reach = radius + self.chunkSize
+        for pt in points:
+            lo = self.keyOf(pt[0] - reach, pt[1] - reach)
+            hi = self.keyOf(pt[0] + reach, pt[1] + reach)
+            for kx in range(max(lo[0], 0), min(hi[0], self.shape[0] - 1) + 1):
+                for ky in range(max(lo[1], 0), min(hi[1], self.shape[1] - 1) + 1):
+                    cx, cy = self.centerOf((kx, ky))
+                    if math.hypot(cx - pt[0], cy - pt[1]) <= radius:
+                        keys.add((kx, ky))
+        return keys
+
+    def warmUp(self):
+        # load every prototype and proxy now, prepare() must not hit the loader
+        for clID in range(1, self.scenario.NUM_MODELS + 1):
+            BuildingCluster.prototype(clID)
+            self.proxy(clID)
+
+    def prepare(self, key):
+        # the chunk's buildings and geometry, not yet in the scene
+        chunk = CityChunk(key, self.centerOf(key))
+        i0 = key[0] * self.chunkBlocks
+        j0 = key[1] * self.chunkBlocks
+        window = (i0, i0 + self.chunkBlocks, j0, j0 + self.chunkBlocks)
+        for model, x, y in self.scenario.buildingsIn(*window):
+            chunk.add(model, Vec3(x, y, 0))
+        chunk.landings = self.scenario.landingsIn(*window)
+        chunk.build(self.NEAR_DIST, self.FAR_DIST)
+        return chunk
+
+    def attach(self, chunk):
+        chunk.placeBuildings()
+        chunk.root.reparentTo(self.parent)
+        self.chunks[chunk.key] = chunk
+        return chunk
+
+    def unload(self, key):
+        chunk = self.chunks.pop(key, None)
+        if chunk is not None:
+            chunk.cleanUp()
+        return chunk
+
+    def get(self, key):
+        return self.chunks.get(key)
+
+    def isLoaded(self, key):
+        return key in self.chunks
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __iter__(self):
+        return iter(list(self.chunks.values()))
+
+    def cleanUp(self):
+        for chunk in self.chunks.values():
+            chunk.cleanUp()
+        self.chunks = {}
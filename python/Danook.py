@@ -11,12 +11,13 @@ from enum import Enum
 
 from BaseObject import *
 from StigChopper import *
+from TelemetryChannel import TelemetryChannel
+import TelemetrySchema
 
 #https://stackoverflow.com/questions/603852/how-do-you-udp-multicast-in-python
 MCAST_GRP = '224.0.0.1'
 MCAST_PORT = 50002
 IS_ALL_GROUPS = True
-MULTICAST_TTL = 2
 
 class State(Enum):
     LANDED = 0,
@@ -28,6 +29,9 @@ class State(Enum):
     TASKS_COMPLETE = 6,
     POWER_DOWN = 7
 
+# telemetry state codes, as listed in DanookTelem.str2State
+STATE_CODES = {st: code + 1 for code, st in enumerate(State)}
+
 class Danook(StigChopper):
     def __init__(self,id, pos, scale=0.2):
         StigChopper.__init__(self,id,pos,"Models/Helicopter", {}, "danook")
@@ -60,6 +64,9 @@ class Danook(StigChopper):
         self.DEBUG_ALT_BIT   = 0x4000
         self.DEBUG_PKG_BIT   = 0x2000
         self.DEBUG_STATE_BIT = 0x1000
+        # db() output, on with any of the bits above
+        self.DBG_MASK        = self.FULL_DEBUG_MASK
+        self.telem = TelemetryChannel.get(MCAST_PORT, MCAST_GRP)
 
         # Control factors ported from Danook Controller
         self.myState = State(State.LANDED)
@@ -99,16 +106,7 @@ class Danook(StigChopper):
                 self.__displayNodePath(child, recurse_level + 1)
 
     def __findClosestDestination(self) -> Vec3:
-        resultPoint = None
-        minDistance = 10000.0
-        for testPoint in self.targetWaypoints:
-            deltaX = testPoint.x - self.actualPosition.x
-            deltaY = testPoint.y - self.actualPosition.y
-            curDistance = math.sqrt(deltaX * deltaX + deltaY * deltaY)
-            if curDistance < minDistance:
-                resultPoint = testPoint
-                minDistance = curDistance
-        return resultPoint
+        return self.waypointGrid.nearest(self.actualPosition, 10000.0)
 
     def __headingValid(self) -> bool:
         headingValid = False
@@ -262,11 +260,11 @@ class Danook(StigChopper):
                 self.desPitch_Degrees = self.MAX_TILT_ALLOW
             if self.desPitch_Degrees < -self.MAX_TILT_ALLOW:
                 self.desPitch_Degrees = -self.MAX_TILT_ALLOW
-            base.dbg(self.TAG, "Desired Rotor: {:.2f}, Dist to target: {:.2f}, Want Accel: {:.2f} ({:.2f},{:.2f}), deltaAngle: {:.2f}, current pitch: {:.2f}".format(self.desMainRotorSpeed_RPM, deltaVector.getXy().length(), deltaAcceleration, deltaXAcceleration, deltaYAcceleration, deltaAngle, self.desPitch_Degrees), self.DEBUG_POS_BIT)
+            base.dbg(self.TAG, "Desired Rotor: %.2f, Dist to target: %.2f, Want Accel: %.2f (%.2f,%.2f), deltaAngle: %.2f, current pitch: %.2f", self.DEBUG_POS_BIT, self.desMainRotorSpeed_RPM, deltaVector.getXy().length(), deltaAcceleration, deltaXAcceleration, deltaYAcceleration, deltaAngle, self.desPitch_Degrees)
         if justStop:
             deltaVx = self.estimatedVelocity.x
             deltaVy = self.estimatedVelocity.y
-            base.dbg(self.TAG, "Trying to stop -- vel: ({:.2f}, {:.2f})".format(self.estimatedVelocity.x, self.estimatedVelocity.y), self.DEBUG_POS_BIT)
+            base.dbg(self.TAG, "Trying to stop -- vel: (%.2f, %.2f)", self.DEBUG_POS_BIT, self.estimatedVelocity.x, self.estimatedVelocity.y)
             delta = math.sqrt(deltaVx * deltaVx + deltaVy * deltaVy)
             if delta < 0.1:
                 success = True
@@ -307,11 +305,11 @@ class Danook(StigChopper):
                 if (actDistance < base.MAX_PACKAGE_DISTANCE):
                     delivered = base.deliverPackage(self.getId())
                     if self.wasOnGround == False:
-                        base.dbg(self.TAG, "Time: {:.2f} -- trying to deliver package at ({:.2f}, {:.2f})".format(self.currTime, self.actualPosition.x,self.actualPosition.y), self.DEBUG_PKG_BIT)
+                        base.dbg(self.TAG, "Time: %.2f -- trying to deliver package at (%.2f, %.2f)", self.DEBUG_PKG_BIT, self.currTime, self.actualPosition.x,self.actualPosition.y)
                     if delivered:
                         #TODO: Delete waypoint if world didn't
                         if self.wasOnGround == False:
-                            base.dbg(self.TAG, "Time: {:.2f} -- Delivered a package".format(self.currTime), self.DEBUG_PKG_BIT)
+                            base.dbg(self.TAG, "Time: %.2f -- Delivered a package", self.DEBUG_PKG_BIT, self.currTime)
                         self.currentDestination = None
                     else:
                         onGround = False
@@ -319,10 +317,10 @@ class Danook(StigChopper):
                     outState = State.CLIMB
                 else:
                     if self.wasOnGround == False:
-                        base.dbg(self.TAG, "Time: {:.2f} -- Too far to deliver package: act: {:.2f}, tol: {:.2f}".format(self.currTime, actDistance, base.MAX_PACKAGE_DISTANCE), self.DEBUG_PKG_BIT)
+                        base.dbg(self.TAG, "Time: %.2f -- Too far to deliver package: act: %.2f, tol: %.2f", self.DEBUG_PKG_BIT, self.currTime, actDistance, base.MAX_PACKAGE_DISTANCE)
             else:
                 if self.wasOnGround == False:
-                    base.dbg(self.TAG, "Time: {:.2f} Landed with no destination?".format(self.currTime), self.DEBUG_PKG_BIT)
+                    base.dbg(self.TAG, "Time: %.2f Landed with no destination?", self.DEBUG_PKG_BIT, self.currTime)
             self.wasOnGround = onGround
         else:
             if inState == State.LANDED:
@@ -338,7 +336,7 @@ class Danook(StigChopper):
             deltaAcceleration = -self.MAX_VERT_ACCEL
         if self.spunUp:
             self.desMainRotorSpeed_RPM += deltaAcceleration * self.VERT_CONTROL_FACTOR
-            base.dbg(self.TAG, "Desired Rotor: {:.2f}, ActHeight: {:.2f}, desHeight: {:.2f}, actVel: {:.2f}, targetVel: {:.2f}, actAccel: {:.2f}, targetAccel: {:.2f}, deltaAccel: {:.2f}".format(self.desMainRotorSpeed_RPM, self.actualPosition.z,self.desiredAltitude,self.estimatedVelocity.z, targetVertVelocity, self.estimatedAcceleration.z, targetVertAcceleration, deltaAcceleration), self.DEBUG_ALT_BIT)
+            base.dbg(self.TAG, "Desired Rotor: %.2f, ActHeight: %.2f, desHeight: %.2f, actVel: %.2f, targetVel: %.2f, actAccel: %.2f, targetAccel: %.2f, deltaAccel: %.2f", self.DEBUG_ALT_BIT, self.desMainRotorSpeed_RPM, self.actualPosition.z,self.desiredAltitude,self.estimatedVelocity.z, targetVertVelocity, self.estimatedAcceleration.z, targetVertAcceleration, deltaAcceleration)
             #self.db(self, "rotor: {:.3f}".format(self.desMainRotorSpeed_RPM))
             base.requestSettings(self.getId(), self.desMainRotorSpeed_RPM, self.desPitch_Degrees, self.desTailRotorSpeed_RPM)
         else:
@@ -360,14 +358,14 @@ class Danook(StigChopper):
                 retVal = self.actualPosition.z > self.SAFE_ALTITUDE
             else:
                 retVal = True
-        base.dbg(self.TAG, "Altitude Safety check result: (climbing? " + str(climbing) + ")" + str(retVal) + " Altitude: " + str(self.actualPosition.z), self.DEBUG_ALT_BIT)
+        base.dbg(self.TAG, "Altitude Safety check result: (climbing? %s)%s Altitude: %s", self.DEBUG_ALT_BIT, climbing, retVal, self.actualPosition.z)
         return retVal
 
     def __controlTheShip(self, isCloser):
         if self.myState == State.APPROACHING and isCloser == False:
             self.myState = State.STOP_NOW
         nextState = self.myState
-        base.dbg(self.TAG, "Control the ship -- state: " + str(self.myState), self.DEBUG_STATE_BIT)
+        base.dbg(self.TAG, "Control the ship -- state: %s", self.DEBUG_STATE_BIT, self.myState)
         match self.myState:
             case State.LANDED:
                 pass
@@ -401,7 +399,7 @@ class Danook(StigChopper):
             case State.TASKS_COMPLETE:
                 self.desMainRotorSpeed_RPM = 0.0
                 self.desiredAltitude = 0.0
-                base.dbg(self.TAG, "Time: {:.2f} -- All packages delivered.  (Powering Down)".format(self.currTime),self.FULL_DEBUG_MASK)
+                base.dbg(self.TAG, "Time: %.2f -- All packages delivered.  (Powering Down)", self.FULL_DEBUG_MASK, self.currTime)
                 print("Time: {:.2f} -- All packages delivered.  (Powering Down)".format(self.currTime))
                 nextState = State.POWER_DOWN
             case State.POWER_DOWN:
@@ -426,7 +424,7 @@ class Danook(StigChopper):
         if self.currentDestination is None:
             self.currentDestination = self.__findClosestDestination()
             if not self.currentDestination is None:
-                base.dbg(self.TAG, "Got a destination ({:2} points remaining)".format(len(self.targetWaypoints)), self.DEBUG_PKG_BIT)
+                base.dbg(self.TAG, "Got a destination (%2d points remaining)", self.DEBUG_PKG_BIT, len(self.targetWaypoints))
             else:
                 if self.myState != State.POWER_DOWN:
                     self.myState = State.TASKS_COMPLETE
@@ -443,20 +441,22 @@ class Danook(StigChopper):
                     newDistance = math.sqrt(deltaX * deltaX + deltaY * deltaY)
                     if newDistance > (oldDistance + 0.5):
                         closer = False
-                        base.dbg(self.TAG, "Wrong way now: " + str(newDistance) + " then: " + str(oldDistance), self.DEBUG_POS_BIT)
+                        base.dbg(self.TAG, "Wrong way now: %s then: %s", self.DEBUG_POS_BIT, newDistance, oldDistance)
                 self.__controlTheShip(closer)
             else:
                 base.dbg(self.TAG, "No physics estimate?", self.DEBUG_POS_BIT)
         self.lastTime = self.currTime
         self.lastPosition = Vec4(self.actualPosition)
 
-    def db(self, msg):
-        msg = f"{self.myState}>{msg}"
-        try:
-            self.sock.sendto(msg.encode(), (MCAST_GRP, MCAST_PORT))
-        except Exception as ex:
-            print(f"Exception sendin, {ex}")
-        try:
-            base.dbg(self.TAG,msg,self.DBG_MASK)
-        except:
-            print(msg)
\ No newline at end of file
+    def db(self, msg, *args, prio = TelemetryChannel.HIGH):
+        # same as BaseStateMachine.db: msg is only built if it goes somewhere
+        debug = base.dbgOn(self.DBG_MASK)
+        if prio == TelemetryChannel.LOW and not debug:
+            return
+        if callable(msg):
+            msg = msg()
+        elif args:
+            msg = msg % args
+        self.telem.post(TelemetrySchema.encode(TelemetrySchema.TEXT, self.id, STATE_CODES[self.myState], self.currTime, msg), prio)
+        if debug:
+            base.dbg(self.TAG, "%s>%s", self.DBG_MASK, self.myState, msg)
\ No newline at end of file
@@ -7,12 +7,13 @@ import socket
 import struct
 from threading import Thread
 import queue
-import re as RegEx
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 import datetime
+from datetime import timedelta
 import math
 import random
+from TelemetryChannel import splitRecords
 
 #https://stackoverflow.com/questions/603852/how-do-you-udp-multicast-in-python
 MCAST_GRP = '224.0.0.1'
@@ -26,6 +27,7 @@ class DanookTelem:
     queue = queue.Queue()
     thread = None
     quit = False
+    dropped = 0
     def __init__(self):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -101,40 +103,21 @@ class DanookTelem:
         while True:
             if self.quit: break
             try:
-                data, addr = self.sock.recvfrom(1024)
+                data, addr = self.sock.recvfrom(2048)
             except socket.error as e:
                 print(f"Exception: {e}")
             else:
-                dataStr = data.decode()
-                self.queue.put(dataStr)
+                try:
+                    recs = splitRecords(data)
+                except (ValueError, struct.error, KeyError) as ex:
+                    # stray traffic on the group, or another schema version
+                    self.dropped += 1
+                    print(f"Dropped datagram {self.dropped} from {addr}: {ex}")
+                    continue
+                for rec in recs:
+                    self.queue.put(rec)
                 #print(dataStr)
 
-    def getData(self,key,msg, endCh = ',',cap = None):
-          bIdx = msg.find(key)
-          eIdx = msg.find(endCh,bIdx+1)
-          res = msg[bIdx:eIdx]
-          if cap is not None:
-            res = RegEx.sub(key,cap,res)
-          res = res.upper()
-          res = f"{res:<45}"
-          return res
-    
-    def getDatFloat(self,key,msg,endCh = ',',cap = None):
-        regEx = f".*{key}(.*?){endCh}.*"
-        ms = RegEx.match(regEx,msg)
-        if ms is not None:
-            valStr = ms.group(1)
-        else:
-            valStr = "0.001"
-            print(f"NOT FOUND msg: {msg}, ms: {ms.group(1)} regex: {regEx}")
-        try:
-            val = float(valStr)
-        except:
-            val = 0.0
-            print(f"NOT A FLOAT msg: {msg}, ms: {ms.group(1)} regex: {regEx}")
-        return val
-    
-
     def str2State(self, which, statStr):
         match(int(statStr)):
             case 1: statStr = "LANDED"
@@ -152,7 +135,10 @@ class DanookTelem:
         try:
             while not self.queue.empty():
                 if self.quit: break
-                msg = self.queue.get()
+                hdr, data = self.queue.get()
+                self.state["text"] = self.str2State("STATE",hdr.state)
+                secFmtStr = str(timedelta(seconds = int(hdr.simTime)))
+                self.elTime["text"] = f"Elapsed: {secFmtStr:>08}"
 
                 #self.lbl1["text"] = self.queue.get()
         except Exception as ex:
@@ -198,7 +184,7 @@ class DanookTelem:
 
 
 if __name__ == "__main__":
-    recv = ApachiTelem()
+    recv = DanookTelem()
     recv.parseAndDisplay()
     recv.startThread()
     print(f"Strting MAIN LOOP")
@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+# Compiled versions of the ChopperInfo rotor, tilt, fuel and heading updates,
+# written as loops over the FleetPhysics rows. With numba installed they are
+# JIT compiled and FleetPhysics.step() uses them; without it they are plain
+# python (still usable for parity checks) and the engine keeps its NumPy path.
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        return wrap
+
+
+@njit(cache=True)
+def updateFuelKernel(n, elapsedTime, fuelPerRev, actMain, fuel, revsSum, burntSum, timeSum, outOfGas):
+    anyOut = False
+    for row in range(n):
+        rotorRevolutions = actMain[row] / 60.0 * elapsedTime
+        fuelBurned = rotorRevolutions * fuelPerRev
+        fuel[row] -= fuelBurned
+        revsSum[row] += rotorRevolutions
+        burntSum[row] += fuelBurned
+        timeSum[row] += elapsedTime
+        outOfGas[row] = fuel[row] < 0.0
+        if outOfGas[row]:
+            fuel[row] = 0.0
+            anyOut = True
+    return anyOut
+
+
+@njit(cache=True)
+def updateRotorKernel(n, elapsedTime, maxSpeed, maxDelta, act, des, rotorPos):
+    deltaRotor = maxDelta * elapsedTime
+    for row in range(n):
+        if des[row] > maxSpeed:
+            des[row] = maxSpeed
+        if act[row] < des[row]:
+            act[row] += deltaRotor
+            if act[row] > des[row]:
+                act[row] = des[row]
+        elif act[row] > des[row]:
+            act[row] -= deltaRotor
+            if act[row] < des[row]:
+                act[row] = des[row]
+        # 1 RPM = 6 degrees per second
+        pos = rotorPos[row] + act[row] * elapsedTime * 60.0
+        while pos >= 360.0:
+            pos -= 360.0 # Just for drawing
+        rotorPos[row] = pos
+
+
+@njit(cache=True)
+def updateTiltKernel(n, elapsedTime, maxTilt, maxDelta, act, des):
+    deltaTilt = maxDelta * elapsedTime
+    for row in range(n):
+        if des[row] > maxTilt:
+            des[row] = maxTilt
+        if des[row] < -maxTilt:
+            des[row] = -maxTilt
+        if act[row] < des[row]:
+            act[row] += deltaTilt
+            if act[row] > des[row]:
+                act[row] = des[row]
+        elif act[row] > des[row]:
+            act[row] -= deltaTilt
+            if act[row] < des[row]:
+                act[row] = des[row]
+
+
+@njit(cache=True)
+def updateHeadingKernel(n, elapsedTime, minTail, maxTail, stableTail, rotationPerRpm, actTail, heading, takenOff):
+    for row in range(n):
+        if not takenOff[row]:
+            continue
+        rotationCalculator = actTail[row]
+        if rotationCalculator < minTail:
+            rotationCalculator = minTail
+        elif rotationCalculator > maxTail:
+            rotationCalculator = maxTail
+        rotorSetting = rotationCalculator - stableTail
+        hdg = heading[row] + (rotorSetting * rotationPerRpm) * elapsedTime
+        while hdg > 360.0:
+            hdg -= 360.0
+        while hdg < 0.0:
+            hdg += 360.0
+        heading[row] = hdg
+
+
+if __name__ == "__main__":
+    # parity check: kernels against the FleetPhysics NumPy expressions
+    import builtins
+    import random
+    from panda3d.core import Vec3
+    from FleetPhysics import FleetPhysics
+    from QuietWorld import QuietWorld
+
+    builtins.base = QuietWorld()
+
+    numChoppers = 256
+    numTicks = 2000
+    tick = 1.0 / 50.0
+    rng = random.Random(3)
+    fleets = [FleetPhysics(100.0, useKernels = False), FleetPhysics(100.0, useKernels = True)]
+    for id in range(numChoppers):
+        pos = Vec3(rng.uniform(-200, 200), rng.uniform(-200, 200), 0.0)
+        hdg = rng.uniform(0, 360)
+        fuel = rng.choice([0.5, 20.0, 150.0])
+        for fleet in fleets:
+            fleet.addChopper(id, fuel, pos, hdg)
+            fleet.cargoMass_kg[id] = 150.0
+    for fleet in fleets:
+        random.seed(5)
+        rng = random.Random(9)
+        for t in range(numTicks):
+            if t % 200 == 0:
+                fleet.desMainRotorSpeed_RPM[:numChoppers] = [rng.uniform(150, 450) for _ in range(numChoppers)]
+                fleet.desTilt_Degrees[:numChoppers] = [rng.uniform(-14, 14) for _ in range(numChoppers)]
+                fleet.desTailRotorSpeed_RPM[:numChoppers] = [rng.uniform(70, 130) for _ in range(numChoppers)]
+            fleet.step(t * tick, tick)
+
+    worst = 0.0
+    for name in FleetPhysics.FLOAT_COLUMNS:
+        a = getattr(fleets[0], name)[:numChoppers]
+        b = getattr(fleets[1], name)[:numChoppers]
+        worst = max(worst, float(max(abs(a - b) / (1.0 + abs(a)))))
+    sameFlags = (fleets[0].takenOff[:numChoppers] == fleets[1].takenOff[:numChoppers]).all()
+    print(f"numba: {HAVE_NUMBA}, {numChoppers} choppers, {numTicks} ticks: worst relative error {worst:.3e}, takenOff equal: {sameFlags}")
+    assert worst <= 1e-6, f"kernels drifted from the NumPy step: {worst:.3e}"
+    assert sameFlags, "kernels disagree with the NumPy step on takenOff"
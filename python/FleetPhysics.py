@@ -0,0 +1,287 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import random
+import numpy as np
+
+import FleetKernels
+
+
+class FleetPhysics:
+    '''
+    Struct-of-arrays state for every chopper in the world. One row per
+    chopper, one NumPy column per quantity; step() integrates the whole
+    fleet at once with the same rules as ChopperInfo.fly(). The rotor,
+    tilt, fuel and heading updates run through FleetKernels when numba is
+    available and through NumPy expressions otherwise.
+    '''
+    TAG = "FleetPhysics"
+    CI_DBG = 0x20000000
+    THRUST_PER_RPM = 11.1111 # N (kg * m/s^2)
+    MAX_MAIN_ROTOR_SPEED = 400.0 # RPM
+    EARTH_ACCELERATION = 9.80665 # m/s^2
+    MAX_TAIL_ROTOR_SPEED = 120.0 # RPM
+    STABLE_TAIL_ROTOR_SPEED = 100.0 # RPM
+    MIN_TAIL_ROTOR_SPEED = 80.0 # RPM
+    MAX_TILT_MAGNITUDE = 10.0 # Degrees
+    MAX_MAIN_ROTOR_DELTA = 60.0 # RPM per Second
+    MAX_TAIL_ROTOR_DELTA = 30.0 # RPM per Second
+    MAX_TILT_DELTA = 3.0 # Degrees per second
+    FUEL_PER_REVOLUTION = 1.0 / 60.0 # Liters
+    ROTATION_PER_TAIL_RPM = 3.0 # degrees per second
+
+    FLOAT_COLUMNS = (
+        "mainRotorPosition_Degrees", "tailRotorPosition_Degrees",
+        "actMainRotorSpeed_RPM", "actTailRotorSpeed_RPM", "actTilt_Degrees",
+        "desMainRotorSpeed_RPM", "desTailRotorSpeed_RPM", "desTilt_Degrees",
+        "remainingFuel_kg", "cargoMass_kg", "heading_Degrees",
+        "accX_ms2", "accY_ms2", "accZ_ms2",
+        "velX_ms", "velY_ms", "velZ_ms",
+        "posX_m", "posY_m", "posZ_m", "posW_s",
+        "m_revs_sum", "m_burnt_sum", "m_time_sum",
+    )
+
+    def __init__(self, baseMass_kg, capacity = 8, useKernels = None):
+        self.baseMass_kg = baseMass_kg
+        self.size = 0
+        self.capacity = capacity
+        self.ids = []
+        if useKernels is None:
+            useKernels = FleetKernels.HAVE_NUMBA
+        self.useKernels = useKernels
+        for name in self.FLOAT_COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype=np.float64))
+        self.takenOff = np.zeros(capacity, dtype=bool)
+        self.outOfGas = np.zeros(capacity, dtype=bool)
+
+    def grow(self):
+        self.capacity *= 2
+        for name in self.FLOAT_COLUMNS:
+            col = np.zeros(self.capacity, dtype=np.float64)
+            col[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, col)
+        col = np.zeros(self.capacity, dtype=bool)
+        col[:self.size] = self.takenOff[:self.size]
+        self.takenOff = col
+        self.outOfGas = np.zeros(self.capacity, dtype=bool)
+
+    def addChopper(self, id, fuelCap, startPos, startHeading):
+        if self.size == self.capacity:
+            self.grow()
+        row = self.size
+        self.size += 1
+        self.ids.append(id)
+        self.remainingFuel_kg[row] = fuelCap
+        self.heading_Degrees[row] = startHeading
+        self.posX_m[row] = startPos.getX()
+        self.posY_m[row] = startPos.getY()
+        self.posZ_m[row] = startPos.getZ()
+        return row
+
+    def approach(self, act, des, delta):
+        # move act towards des by at most delta, without overshooting
+        act[:] = np.where(act < des, np.minimum(act + delta, des),
+                          np.where(act > des, np.maximum(act - delta, des), act))
+
+    def wrapDegrees(self, deg, inclusive):
+        # same result as the "while > 360: -= 360" loops in ChopperInfo
+        if inclusive:
+            over = deg >= 360.0
+            deg[over] -= 360.0 * np.floor(deg[over] / 360.0)
+        else:
+            over = deg > 360.0
+            deg[over] -= 360.0 * (np.ceil(deg[over] / 360.0) - 1.0)
+            under = deg < 0.0
+            deg[under] += 360.0 * np.ceil(-deg[under] / 360.0)
+
+    def updateFuelRemaining(self, n, elapsedTime):
+        # fuel, with the rotor speed from the previous step
+        if self.useKernels:
+            anyOut = FleetKernels.updateFuelKernel(n, elapsedTime, self.FUEL_PER_REVOLUTION,
+                                                   self.actMainRotorSpeed_RPM, self.remainingFuel_kg,
+                                                   self.m_revs_sum, self.m_burnt_sum, self.m_time_sum, self.outOfGas)
+            outOfGas = self.outOfGas[:n]
+        else:
+            fuel = self.remainingFuel_kg[:n]
+            rotorRevolutions = self.actMainRotorSpeed_RPM[:n] / 60.0 * elapsedTime
+            fuelBurned = rotorRevolutions * self.FUEL_PER_REVOLUTION
+            fuel -= fuelBurned
+            self.m_revs_sum[:n] += rotorRevolutions
+            self.m_burnt_sum[:n] += fuelBurned
+            self.m_time_sum[:n] += elapsedTime
+            outOfGas = fuel < 0
+            anyOut = outOfGas.any()
+            fuel[outOfGas] = 0.0
+        if anyOut:
+            self.desMainRotorSpeed_RPM[:n][outOfGas] *= 0.99
+            self.desTailRotorSpeed_RPM[:n][outOfGas] *= 0.99
+            for row in np.flatnonzero(outOfGas):
+                base.dbg(self.TAG,"Out of Gas!",self.CI_DBG)
+                self.desTilt_Degrees[row] += -1.5 + 2.0 * random.randint(0,100) * 0.01
+
+    def updateRotorSpeed(self, n, elapsedTime, maxSpeed, maxDelta, act, des, rotorPos):
+        if self.useKernels:
+            FleetKernels.updateRotorKernel(n, elapsedTime, maxSpeed, maxDelta, act, des, rotorPos)
+            return
+        act = act[:n]
+        des = des[:n]
+        np.minimum(des, maxSpeed, out=des)
+        self.approach(act, des, maxDelta * elapsedTime)
+        rotorPos[:n] += act * elapsedTime * 60.0
+        self.wrapDegrees(rotorPos[:n], True)
+
+    def updateTiltLevel(self, n, elapsedTime):
+        if self.useKernels:
+            FleetKernels.updateTiltKernel(n, elapsedTime, self.MAX_TILT_MAGNITUDE, self.MAX_TILT_DELTA,
+                                          self.actTilt_Degrees, self.desTilt_Degrees)
+            return
+        desTilt = self.desTilt_Degrees[:n]
+        np.clip(desTilt, -self.MAX_TILT_MAGNITUDE, self.MAX_TILT_MAGNITUDE, out=desTilt)
+        self.approach(self.actTilt_Degrees[:n], desTilt, self.MAX_TILT_DELTA * elapsedTime)
+
+    def updateCurrentHeading(self, n, elapsedTime):
+        # Tail rotor only turns the choppers that are airborne
+        if self.useKernels:
+            FleetKernels.updateHeadingKernel(n, elapsedTime, self.MIN_TAIL_ROTOR_SPEED, self.MAX_TAIL_ROTOR_SPEED,
+                                             self.STABLE_TAIL_ROTOR_SPEED, self.ROTATION_PER_TAIL_RPM,
+                                             self.actTailRotorSpeed_RPM, self.heading_Degrees, self.takenOff)
+            return
+        takenOff = self.takenOff[:n]
+        heading = self.heading_Degrees[:n]
+        rotationCalculator = np.clip(self.actTailRotorSpeed_RPM[:n], self.MIN_TAIL_ROTOR_SPEED, self.MAX_TAIL_ROTOR_SPEED)
+        rotorSetting = rotationCalculator - self.STABLE_TAIL_ROTOR_SPEED
+        heading[takenOff] += (rotorSetting[takenOff] * self.ROTATION_PER_TAIL_RPM) * elapsedTime
+        self.wrapDegrees(heading, False)
+
+    def step(self, currentTime, elapsedTime):
+        n = self.size
+        if n == 0:
+            return
+        dbgOn = base.dbgOn(self.CI_DBG)
+        self.updateFuelRemaining(n, elapsedTime)
+        self.updateRotorSpeed(n, elapsedTime, self.MAX_MAIN_ROTOR_SPEED, self.MAX_MAIN_ROTOR_DELTA,
+                              self.actMainRotorSpeed_RPM, self.desMainRotorSpeed_RPM, self.mainRotorPosition_Degrees)
+        self.updateRotorSpeed(n, elapsedTime, self.MAX_TAIL_ROTOR_SPEED, self.MAX_TAIL_ROTOR_DELTA,
+                              self.actTailRotorSpeed_RPM, self.desTailRotorSpeed_RPM, self.tailRotorPosition_Degrees)
+        self.updateTiltLevel(n, elapsedTime)
+
+        actMain = self.actMainRotorSpeed_RPM[:n]
+        actTilt = self.actTilt_Degrees[:n]
+        fuel = self.remainingFuel_kg[:n]
+        heading = self.heading_Degrees[:n]
+        takenOff = self.takenOff[:n]
+        accX = self.accX_ms2[:n]
+        accY = self.accY_ms2[:n]
+        accZ = self.accZ_ms2[:n]
+        velX = self.velX_ms[:n]
+        velY = self.velY_ms[:n]
+        velZ = self.velZ_ms[:n]
+        if dbgOn:
+            for row in range(n):
+                base.dbg(self.TAG, "Chopper %s, Actual Rotor Speed: %.2f, Desired Rotor Speed: %.2f", self.CI_DBG, self.ids[row], actMain[row], self.desMainRotorSpeed_RPM[row])
+
+        # forces
+        totalMass_kg = self.cargoMass_kg[:n] + fuel + self.baseMass_kg
+        downForce_N = totalMass_kg * self.EARTH_ACCELERATION
+        actTilt_radians = np.radians(actTilt)
+        thrust_N = actMain * self.THRUST_PER_RPM
+        liftForce_N = thrust_N * np.cos(actTilt_radians)
+        lateralAcceleration = thrust_N * np.sin(actTilt_radians) / totalMass_kg
+        deltaForce_N = liftForce_N - downForce_N
+        vertAcceleration = deltaForce_N / totalMass_kg
+
+        ascending = deltaForce_N > 0.0
+        if dbgOn:
+            for row in np.flatnonzero(ascending & ~takenOff):
+                base.dbg(self.TAG,"Chopper %s has lifted off!",self.CI_DBG, self.ids[row])
+        takenOff |= ascending
+        # Simple landing check when close to zero
+        nearGround = ~ascending & (self.posZ_m[:n] < 0.25)
+        lateralMagnitude = np.hypot(velX, velY)
+        if dbgOn:
+            for row in np.flatnonzero(nearGround):
+                base.dbg(self.TAG, "Chopper %s Landing check lateral velocity: %.2f (Limit 0.25), Vert: %.2f [-0.0 to -2.0]", self.CI_DBG, self.ids[row], lateralMagnitude[row], velZ[row])
+        landed = nearGround & (lateralMagnitude < 0.25) & (velZ > -2.0) & (velZ < 0.0)
+        if dbgOn:
+            for row in np.flatnonzero(landed & takenOff):
+                base.dbg(self.TAG,"Chopper %s has landed!",self.CI_DBG, self.ids[row])
+        takenOff &= ~landed
+        grounded = ~ascending & ~takenOff
+        accZ[:] = np.where(grounded, 0.0, vertAcceleration)
+        velZ[grounded] = 0.0
+        self.posZ_m[:n][grounded] = 0.0
+
+        # Tail rotor comes into play once airborne
+        self.updateCurrentHeading(n, elapsedTime)
+        heading_radians = np.radians(heading)
+        # For now, we're preventing skating -- chopper sliding along the ground
+        accX[:] = np.where(takenOff, lateralAcceleration * np.cos(heading_radians), 0.0)
+        accY[:] = np.where(takenOff, lateralAcceleration * np.sin(heading_radians), 0.0)
+        velX[~takenOff] = 0.0
+        velY[~takenOff] = 0.0
+
+        # now that accurate acceleration is computed, we can compute new velocity
+        velX += accX * elapsedTime
+        velY += accY * elapsedTime
+        velZ += accZ * elapsedTime
+        # Now that accurate velocity is computed, we can update position
+        self.posX_m[:n] += velX * elapsedTime
+        self.posY_m[:n] += velY * elapsedTime
+        self.posZ_m[:n] += velZ * elapsedTime
+        self.posW_s[:n] = currentTime
+
+
+if __name__ == "__main__":
+    # parity check: the batched step against ChopperInfo.fly on the same inputs
+    import builtins
+    from panda3d.core import Vec3
+    from ChopperInfo import ChopperInfo
+    from QuietWorld import QuietWorld
+
+    builtins.base = QuietWorld()
+
+    numChoppers = 64
+    numTicks = 3000
+    tick = 1.0 / 50.0
+    rng = random.Random(7)
+    starts = [(Vec3(rng.uniform(-200, 200), rng.uniform(-200, 200), 0.0), rng.uniform(0, 360), rng.choice([0.5, 20.0, 150.0])) for _ in range(numChoppers)]
+    requests = [[(rng.uniform(150, 420), rng.uniform(-12, 12), rng.uniform(75, 125)) for _ in range(numChoppers)] for _ in range(numTicks // 250 + 1)]
+
+    scalarFleet = FleetPhysics(base.CHOPPER_BASE_MASS)
+    vectorFleet = FleetPhysics(base.CHOPPER_BASE_MASS, useKernels = False)
+    scalars = [ChopperInfo(i, fuel, pos, hdg, scalarFleet) for i, (pos, hdg, fuel) in enumerate(starts)]
+    vectors = [ChopperInfo(i, fuel, pos, hdg, vectorFleet) for i, (pos, hdg, fuel) in enumerate(starts)]
+    for info in scalars + vectors:
+        info.cargoMass_kg = 150.0
+
+    for infos, stepFleet in ((scalars, None), (vectors, vectorFleet)):
+        random.seed(11)
+        curTime = 0.0
+        for t in range(numTicks):
+            if t % 250 == 0:
+                for info, (main, tilt, tail) in zip(infos, requests[t // 250]):
+                    info.requestMainRotorSpeed(main)
+                    info.requestTiltLevel(tilt)
+                    info.requestTailRotorSpeed(tail)
+            if stepFleet is None:
+                for info in infos:
+                    info.fly(curTime, tick)
+            else:
+                stepFleet.step(curTime, tick)
+            curTime += tick
+
+    tolerance = 1e-6
+    worst = 0.0
+    for name in FleetPhysics.FLOAT_COLUMNS:
+        a = getattr(scalarFleet, name)[:numChoppers]
+        b = getattr(vectorFleet, name)[:numChoppers]
+        err = float(np.max(np.abs(a - b) / np.maximum(1.0, np.abs(a))))
+        worst = max(worst, err)
+        if err > tolerance:
+            print(f"MISMATCH {name}: {err}")
+    sameFlags = np.array_equal(scalarFleet.takenOff[:numChoppers], vectorFleet.takenOff[:numChoppers])
+    airborne = int(np.sum(vectorFleet.takenOff[:numChoppers]))
+    print(f"{numChoppers} choppers, {numTicks} ticks: worst relative error {worst:.3e}, takenOff equal: {sameFlags}, airborne: {airborne}")
+    assert worst <= tolerance, f"batched step drifted from ChopperInfo.fly: {worst:.3e}"
+    assert sameFlags, "batched step disagrees with ChopperInfo.fly on takenOff"
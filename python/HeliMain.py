@@ -3,18 +3,18 @@
 # (c) 2015-2024, A Beloussov, D. Lafuze
 
 from direct.showbase.ShowBase import ShowBase
-from direct.gui.OnscreenImage import OnscreenImage
 from panda3d.core import AmbientLight
 from panda3d.core import DirectionalLight
 from panda3d.core import Vec4, Vec3
 from panda3d.core import CardMaker
-from panda3d.core import loadPrcFile
+from panda3d.core import loadPrcFile, loadPrcFileData
 from panda3d.core import ExecutionEnvironment
 
 #generic python
 import random
 import argparse
 import math
+import time
 import multiprocessing as mp
 
 #our imports
@@ -23,7 +23,17 @@ from Danook import *
 from BaseObject import *
 from StigChopper import *
 from BuildingCluster import *
+from CityChunks import CityChunks
 from ChopperInfo import *
+from FleetPhysics import FleetPhysics
+from TelemetryChannel import TelemetryChannel
+import TravSalesman
+from PlannerService import PlannerService
+from RouteCache import RouteCache
+from SpatialGrid import SpatialGrid
+from LandingPads import LandingPads
+from Scenario import Scenario
+from WorldStreamer import WorldStreamer
 from Camera import HeliCamera
 
 gCH_ID = 0 #chopper index in chopper tuple
@@ -31,7 +41,6 @@ gIN_ID = 1 #info index in chopper tupple
 
 class HeliMain(ShowBase):
     def __init__(self):
-        ShowBase.__init__(self)
         ##==================== PORTED STUFF ================
         ## from World.java
         self.CHOPPER_BASE_MASS = 100.0
@@ -49,6 +58,10 @@ class HeliMain(ShowBase):
         self.curTimeStamp = 0.0
         
         self.TICK_TIME = 1.0 / 50.0
+        self.MAX_FRAME_DT = 0.25 # real seconds, longer frames are treated as a hitch
+        self.MAX_SUB_STEPS = 250 # physics steps per rendered frame before dropping time
+        self.accumulator = 0.0
+        self.droppedTime = 0.0
         self.FULL_BLOCK_SIZE = 100.0
         self.STREET_OFFSET = 3.0
         self.SIDEWALK_OFFSET = 2.0
@@ -65,6 +78,9 @@ class HeliMain(ShowBase):
 
         self.m_chopperInfoPanel = None
         self.m_camToFollow = 1
+        self.headless = False
+        self.seeded = False
+        self.m_engine = "vector"
 
         ap = argparse.ArgumentParser(description="Helicopter Delivery World Simulator")
         ap.add_argument("-x",help="World's x size",default = self.sizeX,dest="sizeX")
@@ -73,6 +89,13 @@ class HeliMain(ShowBase):
         ap.add_argument("-d",help="Debug mask",default="0",dest="debugMask")
         ap.add_argument("-c",help="Index of a chopper to follow",dest="camToFollow",default=0)
         ap.add_argument("-f",help="ratio of world to real time 1 - for real-time 10 - 10x faster",default=self.m_rtToRndRatio,dest="rtRatio")
+        ap.add_argument("-H",help="Headless: no window, run the simulation as fast as possible",action="store_true",dest="headless")
+        ap.add_argument("-t",help="Maximum world time in seconds",default=self.maxTime,dest="maxTime")
+        ap.add_argument("-R",help="Route plan cache directory, none to always plan",default=RouteCache.cacheDir,dest="routeCache")
+        ap.add_argument("-s",help="Scenario seed: same seed, same city, start pads and packages",default=None,dest="seed")
+        ap.add_argument("-S",help="Save the scenario to this JSON file",default=None,dest="saveScenario")
+        ap.add_argument("-L",help="Load the scenario from this JSON file, overrides -x, -y and -s",default=None,dest="loadScenario")
+        ap.add_argument("-e",help="Physics engine: vector - whole fleet per step, scalar - ChopperInfo.fly per chopper",choices=["vector","scalar"],default=self.m_engine,dest="engine")
 
         args = ap.parse_args()
         self.sizeX = int(args.sizeX)
@@ -81,37 +104,72 @@ class HeliMain(ShowBase):
         self.m_dbgMask = int(args.debugMask,0)
         self.m_rtToRndRatio = float(args.rtRatio)
         self.m_camToFollow = float(args.camToFollow)
+        self.headless = args.headless
+        self.maxTime = float(args.maxTime)
+        self.m_engine = args.engine
+        RouteCache.configure(args.routeCache)
+
+        # a named world: plan by step counts, not CPU time, so it flies the same way
+        self.seeded = args.seed is not None or args.loadScenario is not None
+        if args.loadScenario is not None:
+            self.scenario = Scenario.load(args.loadScenario)
+            self.sizeX = self.scenario.sizeX
+            self.sizeY = self.scenario.sizeY
+        else:
+            seed = Scenario.newSeed() if args.seed is None else int(args.seed)
+            # every chopper starts with StigChopper's inventory
+            items = int(0.5 * self.TOTAL_CAPACITY / self.ITEM_WEIGHT)
+            self.scenario = Scenario.generate(seed, self.sizeX, self.sizeY, {0: items, 1: items})
+        if args.saveScenario is not None:
+            self.scenario.save(args.saveScenario)
+        print(f"Scenario seed: {self.scenario.seed}")
+        # rotor and tilt jitter draw from random too, repeat those as well
+        random.seed(self.scenario.seed)
 
         ##==================================================
-        
+
+        # route planning workers start now, not on the first re-plan, and
+        # the route cache reads its disk tier now, not on the first plan
+        PlannerService.get().warmUp(["TravSalesman"])
+        RouteCache.get()
+
+        # headless runs still need render/loader/base, but no window
+        if self.headless:
+            loadPrcFileData("", "audio-library-name null")
+        ShowBase.__init__(self, windowType = 'none' if self.headless else None)
+
         self.pusher = CollisionHandlerPusher()
         self.cTrav = CollisionTraverser()
 
         self.initialCameraPosition = Vec3(0,-340, -60)
-        ambientLight = AmbientLight("ambient light")
-        ambientLight.setColor(Vec4(0.2, 0.2, 0.2, 1))
-        self.ambientLightNodePath = render.attachNewNode(ambientLight)
-        render.setLight(self.ambientLightNodePath)
-        render.setShaderAuto()
-
-        mainLight = DirectionalLight("main light")
-        self.mainLightNodePath = render.attachNewNode(mainLight)
-        # Turn it around by 45 degrees, and tilt it down by 45 degrees
-        self.mainLightNodePath.setHpr(45, -45, 0)
-        render.setLight(self.mainLightNodePath)
-        
-        cm = CardMaker("plane")
-        planeSide = 700
-        cm.setFrame(0, -planeSide, 0, planeSide) #set the size here
-        plane=render.attachNewNode(cm.generate())
-        plane.setHpr(0,90,0)
-        plane.setPos(0.5 * planeSide, 0.5 * planeSide,0)
+        if not self.headless:
+            ambientLight = AmbientLight("ambient light")
+            ambientLight.setColor(Vec4(0.2, 0.2, 0.2, 1))
+            self.ambientLightNodePath = render.attachNewNode(ambientLight)
+            render.setLight(self.ambientLightNodePath)
+            render.setShaderAuto()
+
+            mainLight = DirectionalLight("main light")
+            self.mainLightNodePath = render.attachNewNode(mainLight)
+            # Turn it around by 45 degrees, and tilt it down by 45 degrees
+            self.mainLightNodePath.setHpr(45, -45, 0)
+            render.setLight(self.mainLightNodePath)
+
+            cm = CardMaker("plane")
+            planeSide = 700
+            cm.setFrame(0, -planeSide, 0, planeSide) #set the size here
+            plane=render.attachNewNode(cm.generate())
+            plane.setHpr(0,90,0)
+            plane.setPos(0.5 * planeSide, 0.5 * planeSide,0)
 
         self.city = []
-        self.landings = []
+        # free landing spots of the loaded chunks
+        self.landings = SpatialGrid()
+        self.pads = None if self.headless else LandingPads(render)
         self.generateCity()
 
         self.myChoppers = {}
+        self.fleet = FleetPhysics(self.CHOPPER_BASE_MASS)
         id = 0
         danook = Danook(id,self.getStartingPosition(id))
         self.insertChopper(danook)
@@ -120,69 +178,108 @@ class HeliMain(ShowBase):
         apachi = Apachi(id,self.getStartingPosition(id))
         self.insertChopper(apachi)
 
-        self.updateTask = taskMgr.add(self.update, "update")
         self.exitFunc = self.cleanup
         self.firstUpdate = True
-        self.chaser = HeliCamera(self.cam.getX(),self.cam.getY(),self.cam.getZ())
+        if not self.headless:
+            self.updateTask = taskMgr.add(self.update, "update")
+            self.chaser = HeliCamera(self.cam.getX(),self.cam.getY(),self.cam.getZ())
         self.setChopperWaypoints()
-        for landing in self.landings:
-            # -1 just means don't give it a color
-            self.addLandingPad(-1, landing)
 
     def cleanup(self):
         for chopper in self.myChoppers:
             self.myChoppers[chopper][gCH_ID].cleanUp()
-        for bld in self.city:
-            bld.cleanUp()
+        if self.streamer is not None:
+            self.dbg(self.TAG, "Streamer: %s", self.WORLD_DBG, self.streamer.stats())
+            self.streamer.close()
+            self.streamer = None
+        # the chunks own the buildings in self.city
+        self.chunks.cleanUp()
+        self.city = []
+        CityChunks.clearProxies()
+        BuildingCluster.clearPrototypes()
+        if self.pads is not None:
+            self.pads.cleanUp()
+            self.pads = None
+        TelemetryChannel.closeAll()
+        TravSalesman.closePool()
+        RouteCache.closeAll()
         
     def quit(self):
         self.cleanup()
         base.userExit()
 
-    def generateCityBlock(self,numBldgs, gridX, gridY):
-        bldType = random.randint(1,4)
-        stepX = 30
-        stepY = stepX
-        offsetX = gridX - 0.5 * numBldgs * stepX
-        offsetY = gridY - 0.5 * numBldgs * stepY
-        for xIdx in range(0,numBldgs):
-            for yIdx in range(0,numBldgs):
-                toPlace = random.randint(0,1)
-                centerX = offsetX + xIdx * stepX
-                centerY = offsetY + yIdx * stepY
-                pos = Vec3(centerX, centerY,0)
-                if toPlace == 1:
-                    self.city.append(BuildingCluster(bldType,pos))
-                else:
-                    self.landings.append(pos)
-
     def generateCity(self):
-        cityX = self.sizeX
-        cityY = self.sizeY
-        blockX = 5
-        blockY = 5
-        for gridX in range(-cityX,cityX,blockX):
-            for gridY in range(-cityY,cityY,blockY):
-                self.generateCityBlock(numBldgs=1,gridX = blockX * gridX, gridY=blockY *gridY)
+        # the layout is the scenario's arrays, only chunks near the camera or
+        # a chopper get buildings and pads, the streamer keeps them coming;
+        # headless runs draw nothing, so need none
+        self.chunks = CityChunks(render, self.scenario)
+        self.streamer = None
+        self.reserved = set(self.scenario.starts.values())
+        for spots in self.scenario.packages.values():
+            self.reserved.update(spots)
+        if self.headless:
+            return
+        self.streamer = WorldStreamer(self, self.chunks)
+        self.streamer.start(list(self.scenario.starts.values()))
+
+    def attachChunk(self, chunk):
+        # a chunk the streamer has built joins the scene
+        self.chunks.attach(chunk)
+        self.city.extend(chunk.buildings)
+        for spot in chunk.landings:
+            # start and package pads are drawn by their choppers
+            if spot not in self.reserved:
+                landing = Vec3(spot[0], spot[1], 0)
+                self.landings.add(landing)
+                # -1 just means don't give it a color
+                self.addLandingPad(-1, landing)
+
+    def unloadChunks(self, keys):
+        # chunks the streamer has dropped leave the scene, all in one pass
+        # over self.city
+        gone = set()
+        for key in keys:
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                continue
+            gone.update(id(bld) for bld in chunk.buildings)
+            for spot in chunk.landings:
+                landing = self.landings.get(Vec3(spot[0], spot[1], 0))
+                if landing is not None:
+                    self.landings.remove(landing)
+                    self.removeLandingPad(landing)
+            # BaseObject.cleanUp for every building, then the chunk's nodes
+            self.chunks.unload(key)
+        if gone:
+            self.city = [bld for bld in self.city if id(bld) not in gone]
+
+    def streamFocus(self):
+        # where the streamer keeps the city loaded: the camera and every chopper
+        points = [self.cam.getPos(render)]
+        for chopper in self.myChoppers:
+            points.append(self.myChoppers[chopper][gCH_ID].actor.getPos())
+        return points
     
-    def addLandingPad(self, id, pos):
-        colorRed   = 1.0
-        colorGreen = 1.0
-        colorBlue  = 1.0
-        colorAlpha = 1.0
+    def padColor(self, id):
+        # white for free pads, blue for Danook's, red for Apachi's
         if id == 0:
-            colorRed = 0.0
-            colorGreen = 0.0
+            return (0.0, 0.0, 1.0, 1.0)
         elif id == 1:
-            colorGreen = 0.0
-            colorBlue = 0.0
-        imageObject = OnscreenImage(image="resource/helipad_256.png", pos=(pos.x, pos.y, 0.05), scale=2.0, color=(colorRed, colorGreen, colorBlue, colorAlpha))
-        imageObject.setHpr(0, -90, 0)
-        imageObject.reparentTo(render)
+            return (1.0, 0.0, 0.0, 1.0)
+        return (1.0, 1.0, 1.0, 1.0)
 
-    def update(self,task):
-        dt = globalClock.getDt()
-        self.tick(dt)
+    def addLandingPad(self, id, pos):
+        # one quad per spot in the pad batch: a second call recolours it
+        if self.pads is not None:
+            self.pads.setPad(pos, self.padColor(id))
+
+    def removeLandingPad(self, pos):
+        if self.pads is not None:
+            self.pads.remove(pos)
+
+    def step(self):
+        # one fixed TICK_TIME step of physics and chopper logic
+        self.tick(self.TICK_TIME)
         for chopper in self.myChoppers:
             
             self.myChoppers[chopper][gCH_ID].update(self.curTimeStamp,self.TICK_TIME)
@@ -190,9 +287,55 @@ class HeliMain(ShowBase):
             try:
                 self.myChoppers[chopper][gCH_ID].update(self.curTimeStamp,self.TICK_TIME)
             except Exception as ex:
-                self.dbg(self.TAG, f"ERROR in update(): exception with id {chopper}: {ex}",self.WORLD_DBG)
+                self.dbg(self.TAG, "ERROR in update(): exception with id %s: %s", self.WORLD_DBG, chopper, ex)
             '''
         self.curTimeStamp += self.TICK_TIME
+
+    def allDelivered(self):
+        for id in self.allPackageLocs:
+            if len(self.allPackageLocs[id]) > 0:
+                return False
+        return True
+
+    def runHeadless(self):
+        # no frames, no tasks: step the world back to back until done
+        then = time.time()
+        steps = 0
+        while self.curTimeStamp < self.maxTime and not self.allDelivered():
+            self.step()
+            steps += 1
+        elapsed = time.time() - then
+        rate = steps / elapsed if elapsed > 0.0 else 0.0
+        print(f"Headless run: {steps:,} steps, {self.curTimeStamp:.2f} world secs in {elapsed:.2f} secs ({rate:,.0f} steps/sec), all delivered: {self.allDelivered()}", flush=True)
+        for (group, port), chan in TelemetryChannel.channels.items():
+            print(f"Telemetry {group}:{port}: {chan.stats()}", flush=True)
+        if PlannerService.service is not None:
+            print(f"Planner: {PlannerService.service.stats()}", flush=True)
+        if RouteCache.cache is not None:
+            print(f"Route cache: {RouteCache.cache.stats()}", flush=True)
+        self.cleanup()
+
+    def update(self,task):
+        # world time owed for this frame, run it in fixed TICK_TIME steps
+        frameDt = globalClock.getDt()
+        if frameDt > self.MAX_FRAME_DT:
+            frameDt = self.MAX_FRAME_DT
+        self.accumulator += frameDt * self.m_rtToRndRatio
+        steps = 0
+        while self.accumulator >= self.TICK_TIME:
+            if steps >= self.MAX_SUB_STEPS:
+                # can't keep up with the ratio, drop the backlog instead of spiralling
+                self.droppedTime += self.accumulator
+                self.dbg(self.TAG, "Dropping %.3f world secs, %.3f total", self.WORLD_DBG, self.accumulator, self.droppedTime)
+                self.accumulator = 0.0
+                break
+            self.step()
+            self.accumulator -= self.TICK_TIME
+            steps += 1
+
+        alpha = self.accumulator / self.TICK_TIME
+        for chopper in self.myChoppers:
+            self.myChoppers[chopper][gCH_ID].interpolate(alpha)
         
         if self.firstUpdate:
             self.cam.setPos(self.initialCameraPosition)
@@ -208,24 +351,36 @@ class HeliMain(ShowBase):
                 print("Problem: ",ex)
             pass
 
+        self.streamer.update(self.streamFocus())
         return task.cont
 
     '''
     World.java port here ===================================================================
     '''
-    def dbg(self, tag, msg, bit):
-        if self.m_dbgMask & bit:
-            print("DEBUG: [",tag,"]:", msg, flush=True)
+    def dbgOn(self, bit):
+        # cheap guard for callers that have to do real work to build a message
+        return (self.m_dbgMask & bit) != 0
+
+    def dbg(self, tag, msg, bit, *args):
+        # mask is checked before any formatting: msg may be a callable
+        # returning the text, or a %-style format string with args
+        if not self.m_dbgMask & bit:
+            return
+        if callable(msg):
+            msg = msg()
+        elif args:
+            msg = msg % args
+        print("DEBUG: [",tag,"]:", msg, flush=True)
 
     def getStartingPosition(self, chopperID):
-        whichPos = random.randint(0, len(self.landings)-1)
-        landing = self.landings[whichPos]
+        spot = self.scenario.starts[chopperID]
+        landing = Vec3(spot[0], spot[1], 0)
         self.addLandingPad(chopperID, landing)
-        del(self.landings[whichPos])
         return landing
     
     def insertChopper(self, chopper):
-        chInfo = ChopperInfo(chopper.id, chopper.fuelCapacity(), chopper.actor.getPos(), 0.0)
+        chInfo = ChopperInfo(chopper.id, chopper.fuelCapacity(), chopper.actor.getPos(), 0.0, self.fleet)
+        chInfo.cargoMass_kg = self.ITEM_WEIGHT * chopper.itemCount()
         self.myChoppers[chopper.id] = (chopper,chInfo)
 
     def timeRatio(self):
@@ -234,14 +389,11 @@ class HeliMain(ShowBase):
     def setChopperWaypoints(self):
         for key in self.myChoppers:
             chopper = self.myChoppers[key][gCH_ID]
-            targetPoints = []
-            for idx in range(0,chopper.itemCount()):
-                whichPos = random.randint(0, len(self.landings)-1)
-                targetPoints.append(self.landings[whichPos])
-                del(self.landings[whichPos])
-            self.dbg(self.TAG, "Chopper {} given waypoints -- {} points left".format(key, len(self.landings)), self.WORLD_DBG)
+            targetPoints = [Vec3(x, y, 0) for x, y in self.scenario.packages[key]]
+            self.dbg(self.TAG, "Chopper %s given waypoints -- %d points left", self.WORLD_DBG, key, len(self.landings))
             chopper.setWaypoints(targetPoints)
-            self.allPackageLocs[key] = targetPoints
+            # cells of MAX_PACKAGE_DISTANCE: a delivery looks at 3x3 cells at most
+            self.allPackageLocs[key] = SpatialGrid(targetPoints, self.MAX_PACKAGE_DISTANCE)
 
     def isAirborn(self,id):
         retVal = 1
@@ -257,33 +409,29 @@ class HeliMain(ShowBase):
         return retVal
     
     def deliverPackage(self, id):
-        self.dbg(self.TAG,"Chopper " + str(id) + " trying to deliver a package", self.WORLD_DBG)
+        self.dbg(self.TAG,"Chopper %s trying to deliver a package", self.WORLD_DBG, id)
         success = False
         if id in self.myChoppers:
             chop,info = self.myChoppers[id]
             myPos = self.gps(id)
             if info.onGround():
-                self.dbg(self.TAG,"Chopper " + str(id) + " confirmed on ground", self.WORLD_DBG)
+                self.dbg(self.TAG,"Chopper %s confirmed on ground", self.WORLD_DBG, id)
 				## OK, check position
 				## NOTE: I believe the hashCode function is used to determine
 				## if the container has the object.  That only includes X,Y,Z
 				## which is what I think we want.
-                object = self.allPackageLocs[id]
-                for avec3 in object:
-                    deltaX = avec3.x - myPos.x
-                    deltaY = avec3.y - myPos.y
-                    delta = math.sqrt(deltaX * deltaX + deltaY * deltaY)
-                    self.dbg(self.TAG,f"Checking: vec {avec3.x:3.4f},{avec3.y:3.4f},{avec3.z:3.4f}, dist: {delta: 3.4f}, id: {id}",self.WORLD_DBG)
-                    if delta < self.MAX_PACKAGE_DISTANCE:
-                        self.dbg(self.TAG,"Chopper {} delivered package to ({:.2f}, {:.2f})".format(id, avec3.x, avec3.y), self.WORLD_DBG)
-                        object.remove(avec3)
-                        # Key to remove the waypoint from the chopper's list
-                        # Otherwise it could try again at the same location
-                        chop.setWaypoints(object)
-                        success = True
-                        break
+                packages = self.allPackageLocs[id]
+                avec3 = packages.nearest(myPos, self.MAX_PACKAGE_DISTANCE)
+                if avec3 is not None:
+                    self.dbg(self.TAG,"Chopper %s delivered package to (%.2f, %.2f)", self.WORLD_DBG, id, avec3.x, avec3.y)
+                    packages.remove(avec3)
+                    # Key to remove the waypoint from the chopper's list
+                    # Otherwise it could try again at the same location
+                    chop.removeWaypoint(avec3)
+                    info.cargoMass_kg = self.ITEM_WEIGHT * chop.itemCount()
+                    success = True
                 if not success:
-                    self.dbg(self.TAG,f"Couldn't find package to deliver at ({myPos})", self.WORLD_DBG)
+                    self.dbg(self.TAG,"Couldn't find package to deliver at (%s)", self.WORLD_DBG, myPos)
         return success
 
     def getChopper(self,id):
@@ -314,11 +462,17 @@ class HeliMain(ShowBase):
     # I think dt is deprecated unless we want to pass self.TICK_TIME to it
     def tick(self, dt):
         outOfTime = False
+        if self.m_engine == "vector":
+            try:
+                self.fleet.step(self.curTimeStamp, self.TICK_TIME)
+            except Exception as ex:
+                self.dbg(self.TAG, "ERROR in tick(): exception stepping fleet: %s",self.WORLD_DBG, ex)
+            return outOfTime
         for id in self.myChoppers:
             try:
                 self.myChoppers[id][gIN_ID].fly(self.curTimeStamp, self.TICK_TIME)
             except Exception as ex:
-                self.dbg(self.TAG, f"ERROR in tick(): exception with id {id}: {ex}",self.WORLD_DBG)
+                self.dbg(self.TAG, "ERROR in tick(): exception with id %s: %s",self.WORLD_DBG, id, ex)
         return outOfTime
                
     def gps(self,id):
@@ -346,7 +500,10 @@ def main():
     print("Trying to open config: " + str(fullPath))
     loadPrcFile(fullPath)
     heliMain = HeliMain()
-    heliMain.run()
+    if heliMain.headless:
+        heliMain.runHeadless()
+    else:
+        heliMain.run()
 
 if __name__ == "__main__":
     mp.freeze_support()
@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import heapq
+import importlib
+import math
+import os
+import threading
+import time
+import multiprocessing as mp
+from concurrent.futures import Future, ProcessPoolExecutor
+
+class PlannerJob:
+    def __init__(self, func, args, priority, deadline, seq):
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.deadline = deadline
+        self.seq = seq
+        self.future = Future()
+        self.submitted = time.time()
+        self.started = None
+
+def importModule(name):
+    importlib.import_module(name)
+    return os.getpid()
+
+class PlannerService:
+    '''
+    Long lived worker pool for route planning, started once by HeliMain and
+    shared by every chopper. submit() returns a Future right away; jobs wait
+    in a priority queue (priority, then earliest deadline, then arrival) and
+    only IN_FLIGHT_PER_WORKER per worker are handed to the processes, so a
+    high priority job never queues behind a long batch. A job whose deadline
+    passes before it starts is cancelled instead of run. stats() reports
+    queue depth, wait and run latencies.
+    '''
+    TAG = "PlannerService"
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    IN_FLIGHT_PER_WORKER = 2
+
+    service = None
+    serviceLock = threading.Lock()
+
+    @classmethod
+    def get(cls, numWorkers = None):
+        with cls.serviceLock:
+            if cls.service is None:
+                cls.service = PlannerService(numWorkers)
+            return cls.service
+
+    @classmethod
+    def closeAll(cls):
+        with cls.serviceLock:
+            service = cls.service
+            cls.service = None
+        if service is not None:
+            service.close()
+
+    def __init__(self, numWorkers = None):
+        if numWorkers is None:
+            numWorkers = max(1, int(os.cpu_count() * 0.9))
+        self.numWorkers = numWorkers
+        self.executor = ProcessPoolExecutor(numWorkers, mp_context = mp.get_context("spawn"))
+        self.lock = threading.Lock()
+        self.queue = []
+        self.seq = 0
+        self.inFlight = 0
+        self.closed = False
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.maxQueued = 0
+        self.waitSum = 0.0
+        self.waitMax = 0.0
+        self.runSum = 0.0
+        self.runMax = 0.0
+
+    def warmUp(self, modules):
+        # start every worker now and import the planning code there, so the
+        # first real job doesn't pay for process start and module import
+        for _ in range(self.numWorkers):
+            for name in modules:
+                self.submit(importModule, name, priority = self.HIGH)
+
+    def submit(self, func, *args, priority = NORMAL, deadline = None):
+        with self.lock:
+            if self.closed:
+                raise RuntimeError(f"{self.TAG}: submit after close")
+            self.seq += 1
+            job = PlannerJob(func, args, priority, math.inf if deadline is None else deadline, self.seq)
+            heapq.heappush(self.queue, (job.priority, job.deadline, job.seq, job))
+            self.submitted += 1
+            self.maxQueued = max(self.maxQueued, len(self.queue))
+        self.dispatch()
+        return job.future
+
+    def dispatch(self):
+        # hand queued jobs to the processes up to the in-flight limit
+        late = []
+        start = []
+        with self.lock:
+            now = time.time()
+            while self.queue and not self.closed and self.inFlight < self.numWorkers * self.IN_FLIGHT_PER_WORKER:
+                job = heapq.heappop(self.queue)[-1]
+                if job.future.cancelled():
+                    self.cancelled += 1
+                elif job.deadline < now:
+                    self.expired += 1
+                    late.append(job)
+                elif job.future.set_running_or_notify_cancel():
+                    job.started = now
+                    self.inFlight += 1
+                    start.append(job)
+                else:
+                    self.cancelled += 1
+        # futures run their callbacks, do that outside the lock
+        for job in late:
+            job.future.cancel()
+        for job in start:
+            try:
+                inner = self.executor.submit(job.func, *job.args)
+            except Exception as ex:
+                self.finishJob(job, None, ex)
+                continue
+            inner.add_done_callback(lambda inner, job = job: self.jobDone(job, inner))
+
+    def jobDone(self, job, inner):
+        if inner.cancelled():
+            self.finishJob(job, None, RuntimeError(f"{self.TAG}: pool shut down"))
+        else:
+            self.finishJob(job, inner.result() if inner.exception() is None else None, inner.exception())
+
+    def finishJob(self, job, result, ex):
+        now = time.time()
+        with self.lock:
+            self.inFlight -= 1
+            wait = job.started - job.submitted
+            run = now - job.started
+            self.waitSum += wait
+            self.waitMax = max(self.waitMax, wait)
+            self.runSum += run
+            self.runMax = max(self.runMax, run)
+            if ex is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if ex is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(ex)
+        self.dispatch()
+
+    def queueDepth(self):
+        with self.lock:
+            return len(self.queue)
+
+    def stats(self):
+        with self.lock:
+            started = self.completed + self.failed
+            return {"submitted": self.submitted,
+                    "completed": self.completed,
+                    "failed": self.failed,
+                    "expired": self.expired,
+                    "cancelled": self.cancelled,
+                    "queued": len(self.queue),
+                    "maxQueued": self.maxQueued,
+                    "inFlight": self.inFlight,
+                    "waitMsAvg": round(self.waitSum / started * 1e3, 2) if started else 0.0,
+                    "waitMsMax": round(self.waitMax * 1e3, 2),
+                    "runMsAvg": round(self.runSum / started * 1e3, 2) if started else 0.0,
+                    "runMsMax": round(self.runMax * 1e3, 2)}
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            queued = [entry[-1] for entry in self.queue]
+            self.queue = []
+            self.cancelled += len(queued)
+        for job in queued:
+            job.future.cancel()
+        self.executor.shutdown(wait = True, cancel_futures = True)
+
+
+if __name__ == "__main__":
+    # priorities and deadlines: a late high priority job overtakes a queued batch
+    service = PlannerService.get(1)
+    service.warmUp(["numpy"])
+    order = []
+    batch = [service.submit(time.sleep, 0.05) for _ in range(6)]
+    for idx, future in enumerate(batch):
+        future.add_done_callback(lambda f, idx = idx: order.append(f"batch{idx}"))
+    urgent = service.submit(importModule, "math", priority = PlannerService.HIGH)
+    urgent.add_done_callback(lambda f: order.append("urgent"))
+    stale = service.submit(time.sleep, 0.05, deadline = time.time() + 0.01)
+    for future in batch + [urgent]:
+        future.result()
+    print(f"completion order: {order}")
+    print(f"stale job cancelled: {stale.cancelled()}")
+    print(f"stats: {service.stats()}")
+    PlannerService.closeAll()
@@ -0,0 +1,18 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+class QuietWorld:
+    '''
+    Stands in for HeliMain as base in the __main__ checks of modules that
+    run without a world: the settings they read, and debug output that is
+    always off.
+    '''
+    m_dbgMask = 0
+    CHOPPER_BASE_MASS = 100.0
+
+    def dbgOn(self, bit):
+        return False
+
+    def dbg(self, tag, msg, bit, *args):
+        pass
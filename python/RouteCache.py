@@ -0,0 +1,201 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import collections
+import hashlib
+import json
+import os
+import threading
+
+from TravSalesman import SCORE_PARAMS
+
+def defaultDir():
+    root = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(root, "heli-sim", "routes")
+
+class RouteCache:
+    '''
+    Solved tours, content addressed: the key is a hash of the start position
+    and the sorted waypoint set, both quantised to QUANT_M, plus the scoring
+    parameters, so the order the points come in doesn't matter and a change
+    to the score function misses instead of returning stale tours. Entries
+    keep the tour as quantised points, an in-memory LRU of CAPACITY entries
+    sits in front of one JSON file per key under path. lookup() and store()
+    run on the sim thread and never touch the disk: the newest CAPACITY
+    files are read when the cache is made, at startup, and stored entries
+    are written out by a background thread. path None keeps the memory tier
+    only.
+    '''
+    TAG = "RouteCache"
+
+    QUANT_M = 1.0
+    CAPACITY = 256
+
+    cache = None
+    cacheLock = threading.Lock()
+    cacheDir = defaultDir()
+    enabled = True
+
+    @classmethod
+    def configure(cls, path):
+        # HeliMain -R: a directory, or "none" to plan everything from scratch
+        with cls.cacheLock:
+            cls.enabled = path is None or str(path).lower() != "none"
+            cls.cacheDir = path if cls.enabled else None
+            cache, cls.cache = cls.cache, None
+        if cache is not None:
+            cache.close()
+
+    @classmethod
+    def get(cls):
+        with cls.cacheLock:
+            if not cls.enabled:
+                return None
+            if cls.cache is None:
+                cls.cache = RouteCache(cls.cacheDir)
+            return cls.cache
+
+    @classmethod
+    def closeAll(cls):
+        with cls.cacheLock:
+            cache, cls.cache = cls.cache, None
+        if cache is not None:
+            cache.close()
+
+    def __init__(self, path, capacity = CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.lru = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.writes = collections.deque()
+        self.wake = threading.Event()
+        self.quit = False
+        self.thread = None
+        self.hits = 0
+        self.loaded = 0
+        self.misses = 0
+        self.stores = 0
+        self.written = 0
+        self.errors = 0
+        if path is not None:
+            try:
+                os.makedirs(path, exist_ok = True)
+            except OSError as ex:
+                print(f"{self.TAG}: can't use {path}: {ex}")
+                self.path = None
+        if self.path is not None:
+            self.preload()
+            self.thread = threading.Thread(target = self.writeThread, name = "route-cache", daemon = True)
+            self.thread.start()
+
+    def quant(self, pt):
+        return (round(pt.x / self.QUANT_M), round(pt.y / self.QUANT_M))
+
+    def key(self, start, points):
+        desc = json.dumps([self.quant(start), sorted(self.quant(pt) for pt in points), SCORE_PARAMS])
+        return hashlib.sha1(desc.encode()).hexdigest()
+
+    def fileName(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def preload(self):
+        # the newest capacity entries on disk, oldest first so the LRU order
+        # matches; anything older than those misses
+        try:
+            files = [entry for entry in os.scandir(self.path) if entry.name.endswith(".json")]
+            files.sort(key = lambda entry: entry.stat().st_mtime)
+        except OSError as ex:
+            print(f"{self.TAG}: can't read {self.path}: {ex}")
+            self.errors += 1
+            return
+        for entry in files[-self.capacity:]:
+            try:
+                with open(entry.path) as fp:
+                    self.remember(entry.name[:-len(".json")], json.load(fp))
+                self.loaded += 1
+            except (OSError, ValueError) as ex:
+                print(f"{self.TAG}: bad entry {entry.name}: {ex}")
+                self.errors += 1
+
+    def lookup(self, start, points):
+        # (order, score, exact) with order indexing points, or None
+        key = self.key(start, points)
+        with self.lock:
+            entry = self.lru.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.lru.move_to_end(key)
+            self.hits += 1
+        where = {self.quant(pt): idx for idx, pt in enumerate(points)}
+        order = [where.get(tuple(qp)) for qp in entry["tour"]]
+        if len(where) != len(points) or None in order:
+            # two points in one quantum, can't map the tour back
+            return None
+        return order, entry["score"], entry["exact"]
+
+    def remember(self, key, entry):
+        self.lru[key] = entry
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.capacity:
+            self.lru.popitem(last = False)
+
+    def store(self, start, points, order, score, exact, serve = True):
+        # serve False only writes it out, for the next run to read
+        key = self.key(start, points)
+        entry = {"tour": [self.quant(points[idx]) for idx in order], "score": float(score), "exact": bool(exact)}
+        with self.lock:
+            if serve:
+                self.remember(key, entry)
+            self.stores += 1
+            if self.thread is None or self.quit:
+                return
+            self.writes.append((key, entry))
+        self.wake.set()
+
+    def write(self, key, entry):
+        tmpName = f"{self.fileName(key)}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmpName, "w") as fp:
+                json.dump(entry, fp)
+            os.replace(tmpName, self.fileName(key))
+            written = 1
+        except OSError as ex:
+            print(f"{self.TAG}: can't write {key}: {ex}")
+            written = 0
+        with self.lock:
+            self.written += written
+            self.errors += 1 - written
+
+    def writeThread(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            while True:
+                with self.lock:
+                    if not self.writes:
+                        break
+                    key, entry = self.writes.popleft()
+                self.write(key, entry)
+            if self.quit:
+                return
+
+    def close(self):
+        # writes out whatever is still queued
+        with self.lock:
+            self.quit = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(5.0)
+            self.thread = None
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits,
+                    "loaded": self.loaded,
+                    "misses": self.misses,
+                    "stores": self.stores,
+                    "written": self.written,
+                    "errors": self.errors,
+                    "entries": len(self.lru)}
@@ -0,0 +1,279 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import queue
+import random
+import time
+import numpy as np
+
+from TravSalesman import *
+from RouteCache import RouteCache
+
+class RoutePlanner:
+    '''
+    Anytime delivery route for one chopper. sync() hands it the current
+    position and the points still to deliver; it starts from a greedy tour
+    and improve() works on it for at most a slice of thread CPU time per
+    call: batched 2-opt/Or-opt sweeps, then double-bridge kicks from the
+    best tour (iterated local search) until KICKS_STALE kicks in a row fail
+    to help. bestTour() is always usable. After a delivery sync() keeps the
+    improved order of the remaining points instead of starting over, and
+    popNext() cuts the next leg's table out of the current one.
+    Once settled, an exact RouteSearch runs on the worker pool; its result
+    comes back on a queue that improve() polls, and a sync() cancels it.
+    Nothing exact runs on the caller's thread, however few the points, and
+    the search's tasks go in and get cancelled from a thread of their own.
+    Finished routes go to the RouteCache; a sync() that hits an exact entry
+    is settled on the spot and plans nothing, an inexact one (a search cut
+    short by its deadline) only seeds the search, which runs as usual.
+    With steps set, improve() makes that many step() calls instead of
+    spending CPU time, and the exact search's result is only written out
+    for the next run to read: when it comes back depends on the pool, and a
+    seeded run has to fly the same route every time.
+    '''
+    TAG = "RoutePlanner"
+    DBG_MASK = 0x20
+
+    BUDGET_SECS = 0.001
+    # about BUDGET_SECS worth at 15 points
+    STEPS = 8
+    SWEEP_ROWS = 512
+    KICKS_STALE = 12
+
+    def __init__(self, seed = 0, budget = BUDGET_SECS, cache = None, steps = None):
+        self.budget = budget
+        self.steps = steps
+        self.cache = RouteCache.get() if cache is None else cache
+        self.rng = random.Random(seed)
+        self.start = None
+        self.points = []
+        self.table = None
+        self.best = np.zeros(0, dtype=np.int64)
+        self.bestScore = 0.0
+        self.settled = True
+        self.results = queue.Queue()
+        self.search = None
+        self.searched = False
+        self.resetSearch()
+
+    def resetSearch(self):
+        self.cur = self.best.copy()
+        self.curScore = self.bestScore
+        self.moves = tourMoves(len(self.best))
+        self.sweepPos = 0
+        self.sweepScore = np.inf
+        self.sweepCand = None
+        self.stale = 0
+        self.settled = len(self.best) < 3
+        self.searched = False
+        if self.search is not None:
+            self.search.cancel(background = True)
+            self.search = None
+
+    def sync(self, curPos, wps, table = None):
+        # re-plan from curPos over wps, keeping the current order of points
+        # that are still there; new points go on the end for the search to place
+        left = {}
+        for idx, pt in enumerate(wps):
+            left.setdefault((pt.x, pt.y), idx)
+        order = []
+        for pt in self.bestTour():
+            idx = left.pop((pt.x, pt.y), None)
+            if idx is not None:
+                order.append(idx)
+        fresh = self.table is None
+        order += list(left.values())
+        self.start = Vec3(curPos.x, curPos.y, curPos.z)
+        self.points = list(wps)
+        self.table = ScoreTable(self.start.xy, self.points) if table is None else table
+        hit = None
+        if self.cache is not None and len(self.points) >= 3:
+            hit = self.cache.lookup(self.start, self.points)
+        if hit is not None:
+            order = hit[0]
+        elif fresh:
+            order = greedyTour(self.table)
+        self.best = np.array(order, dtype=np.int64)
+        self.bestScore = self.table.score(self.best)
+        self.resetSearch()
+        if hit is not None and hit[2]:
+            self.settled = True
+            self.searched = True
+
+    def remember(self, exact):
+        if self.cache is not None and len(self.best) >= 3:
+            self.cache.store(self.start, self.points, self.best, self.bestScore, exact)
+
+    def popNext(self):
+        # commit to the first stop: the rest of the tour is planned from there
+        if not len(self.best):
+            return None
+        nxt = self.points[self.best[0]]
+        rest = self.best[1:]
+        self.sync(nxt, [self.points[idx] for idx in rest], self.table.fromPoint(self.best[0], rest))
+        return nxt
+
+    def bestTour(self):
+        return [self.points[idx] for idx in self.best]
+
+    def kick(self, order):
+        n = len(order)
+        if n >= 8:
+            a, b, c = sorted(self.rng.sample(range(1, n), 3))
+            return np.concatenate((order[:a], order[b:c], order[a:b], order[c:]))
+        i, j = sorted(self.rng.sample(range(n), 2))
+        kicked = order.copy()
+        kicked[i:j + 1] = kicked[i:j + 1][::-1]
+        return kicked
+
+    def step(self):
+        rows = self.moves[self.sweepPos:self.sweepPos + self.SWEEP_ROWS]
+        cands = self.cur[rows]
+        sc = self.table.scores(cands)
+        idx = int(np.argmin(sc))
+        if sc[idx] < self.sweepScore:
+            self.sweepScore, self.sweepCand = float(sc[idx]), cands[idx]
+        self.sweepPos += self.SWEEP_ROWS
+        if self.sweepPos < len(self.moves):
+            return
+        # end of a sweep: take the best move, or kick once no move helps
+        if self.sweepScore < self.curScore - 1e-12:
+            self.cur, self.curScore = self.sweepCand, self.sweepScore
+        else:
+            if self.curScore < self.bestScore - 1e-12:
+                self.best, self.bestScore = self.cur, self.curScore
+                self.stale = 0
+            else:
+                self.stale += 1
+            if self.stale >= self.KICKS_STALE:
+                self.settled = True
+                return
+            self.cur = self.kick(self.best)
+            self.curScore = self.table.score(self.cur)
+        self.sweepPos = 0
+        self.sweepScore = np.inf
+        self.sweepCand = None
+
+    def pollSearch(self):
+        while True:
+            try:
+                search = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if search is not self.search:
+                continue
+            self.search = None
+            if self.steps is not None:
+                if self.cache is not None:
+                    self.cache.store(self.start, self.points, search.order, search.score, search.exact, serve = False)
+                continue
+            if search.score < self.bestScore - 1e-12:
+                base.dbg(self.TAG, "exact search: %.4f -> %.4f", self.DBG_MASK, self.bestScore, search.score)
+                self.best = np.array(search.order, dtype=np.int64)
+                self.bestScore = self.table.score(self.best)
+            self.remember(search.exact)
+
+    def improve(self, budget = None):
+        # returns True once the route is settled
+        self.pollSearch()
+        if self.settled:
+            return True
+        if self.steps is not None:
+            for _ in range(self.steps):
+                if self.settled:
+                    break
+                self.step()
+        else:
+            deadline = time.thread_time() + (self.budget if budget is None else budget)
+            while not self.settled and time.thread_time() < deadline:
+                self.step()
+        if self.settled:
+            base.dbg(self.TAG, "%d points settled, score %.4f", self.DBG_MASK, len(self.best), self.bestScore)
+            if not self.searched:
+                self.search = RouteSearch(self.table, self.bestScore, self.best, self.results).start(background = True)
+                self.searched = True
+        return self.settled
+
+if __name__ == '__main__':
+    import builtins
+    import tempfile
+    from QuietWorld import QuietWorld
+
+    builtins.base = QuietWorld()
+
+    cacheDir = tempfile.mkdtemp()
+    rng = random.Random(7)
+    start = Vec3(0.0, 0.0, 0.0)
+    for numPts in (15, 40):
+        wps = [Vec3(rng.uniform(-300, 300), rng.uniform(-300, 300), 0.0) for _ in range(numPts)]
+        planner = RoutePlanner(cache = RouteCache(cacheDir))
+        planner.sync(start, wps)
+        greedy = planner.bestScore
+        calls = 0
+        then = time.thread_time()
+        while not planner.improve():
+            calls += 1
+        cpu = time.thread_time() - then
+        msg = f"{numPts} points: greedy {greedy:.4f}, settled {planner.bestScore:.4f} after {calls} calls, {cpu:.2f} cpu secs"
+        if numPts <= HK_MAX_POINTS:
+            msg += f", held-karp {heldKarp(planner.table)[0]:.4f}"
+        print(msg)
+        # the exact search finishes on the pool while the caller keeps ticking
+        then = time.time()
+        while planner.search is not None:
+            time.sleep(0.01)
+            planner.improve()
+        print(f"{numPts} points: after the exact search {planner.bestScore:.4f}, {time.time() - then:.2f} secs later")
+        # writes the tour out before another cache reads the directory
+        planner.cache.close()
+        # a second run over the same points, shuffled, comes off the disk tier
+        shuffled = wps[:]
+        rng.shuffle(shuffled)
+        again = RoutePlanner(cache = RouteCache(cacheDir))
+        then = time.thread_time()
+        again.sync(start, shuffled)
+        print(f"{numPts} points: cached {again.bestScore:.4f}, settled {again.settled} in {time.thread_time() - then:.4f} cpu secs, {again.cache.stats()}")
+        # an inexact entry seeds the search but doesn't stop it: the exact
+        # search still runs and its result replaces the entry
+        cache = RouteCache(None)
+        greedy = greedyTour(planner.table)
+        cache.store(start, wps, greedy, planner.table.score(greedy), False)
+        seeded = RoutePlanner(cache = cache)
+        seeded.sync(start, wps)
+        assert not seeded.settled and not seeded.searched
+        while not seeded.improve() or seeded.search is not None:
+            time.sleep(0.001)
+        _, score, exact = cache.lookup(start, wps)
+        assert seeded.searched and score < planner.table.score(greedy)
+        assert exact or numPts > HK_MAX_POINTS
+        print(f"{numPts} points: inexact entry searched again, {score:.4f}, exact {exact}")
+        # deliveries: each re-plan starts from the improved order, and no
+        # single call is long enough to hold up a tick
+        then = time.thread_time()
+        slowest = 0.0
+        while planner.bestTour():
+            tick = time.perf_counter()
+            planner.popNext()
+            slowest = max(slowest, time.perf_counter() - tick)
+            while True:
+                tick = time.perf_counter()
+                settled = planner.improve()
+                slowest = max(slowest, time.perf_counter() - tick)
+                if settled:
+                    break
+        print(f"{numPts} points: {numPts} deliveries re-planned in {time.thread_time() - then:.2f} cpu secs, slowest call {slowest * 1e3:.2f} ms")
+        # step budgets: two planners fly the same route whatever the pool does
+        routes = []
+        for _ in range(2):
+            stepped = RoutePlanner(cache = RouteCache(None), steps = RoutePlanner.STEPS)
+            stepped.sync(start, wps)
+            route = []
+            while stepped.bestTour():
+                for _ in range(5):
+                    stepped.improve()
+                route.append(stepped.popNext())
+            routes.append(route)
+        assert routes[0] == routes[1]
+        print(f"{numPts} points: {RoutePlanner.STEPS} steps a call, same route twice")
+    closePool()
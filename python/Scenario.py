@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import base64
+import json
+import math
+import random
+import zlib
+
+import numpy as np
+
+class Scenario:
+    '''
+    Everything random about a run's world, as plain data: the city layout,
+    each chopper's start pad and its package drop points. generate() derives
+    it all from one seed, so a seed names a world; save()/load() keep it as
+    JSON so the same world can be replayed, or shared, without regenerating
+    it. The layout is one array of city blocks, cells[i, j]: 0 is a landing
+    spot, 1..NUM_MODELS the building cluster standing there, made in a
+    single vectorised pass so 1000x1000 blocks take milliseconds. Nothing
+    here is a scene object; buildingsIn()/landingsIn() hand out (x, y)
+    positions for the blocks a caller actually wants to build.
+    '''
+    TAG = "Scenario"
+
+    VERSION = 2
+    BLOCK = 5
+    STEP = 30
+    NUM_MODELS = 4
+    # blocks are BLOCK * BLOCK apart, centred half a STEP back
+    SPACING = BLOCK * BLOCK
+
+    def __init__(self, seed, sizeX, sizeY, cells, starts, packages):
+        self.seed = seed
+        self.sizeX = sizeX
+        self.sizeY = sizeY
+        self.cells = cells
+        # {id: (x, y)}, {id: [(x, y)]}
+        self.starts = starts
+        self.packages = packages
+        self.originX = -self.BLOCK * sizeX - 0.5 * self.STEP
+        self.originY = -self.BLOCK * sizeY - 0.5 * self.STEP
+
+    @classmethod
+    def newSeed(cls):
+        return random.randrange(2 ** 31)
+
+    @classmethod
+    def gridShape(cls, sizeX, sizeY):
+        # blocks along x and y for a world of +-size
+        return (len(range(-sizeX, sizeX, cls.BLOCK)), len(range(-sizeY, sizeY, cls.BLOCK)))
+
+    @classmethod
+    def generate(cls, seed, sizeX, sizeY, items):
+        # items: {chopper id: package count}, ids get their pads in id order
+        rng = np.random.default_rng(seed)
+        shape = cls.gridShape(sizeX, sizeY)
+        models = rng.integers(1, cls.NUM_MODELS + 1, size = shape, dtype = np.uint8)
+        built = rng.integers(0, 2, size = shape, dtype = np.uint8).astype(bool)
+        cells = np.where(built, models, np.uint8(0))
+        free = np.flatnonzero(cells == 0)
+        ids = sorted(items)
+        wanted = len(ids) + sum(items[id] for id in ids)
+        if wanted > len(free):
+            raise ValueError(f"{cls.TAG}: {wanted} pads wanted, the city has {len(free)} landing spots")
+        picks = rng.choice(free, size = wanted, replace = False)
+        scenario = Scenario(seed, sizeX, sizeY, cells, {}, {})
+        spots = scenario.spotsOf(*np.unravel_index(picks, shape))
+        for id in ids:
+            scenario.starts[id] = spots.pop(0)
+        for id in ids:
+            scenario.packages[id] = spots[:items[id]]
+            del spots[:items[id]]
+        return scenario
+
+    def spotsOf(self, iIdx, jIdx):
+        xs = self.originX + self.SPACING * iIdx.astype(np.float64)
+        ys = self.originY + self.SPACING * jIdx.astype(np.float64)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def cellOf(self, x, y):
+        return (math.floor((x - self.originX) / self.SPACING + 0.5), math.floor((y - self.originY) / self.SPACING + 0.5))
+
+    def buildingsIn(self, i0, i1, j0, j1):
+        # [(model, x, y)] of the blocks [i0, i1) x [j0, j1)
+        window = self.cells[i0:i1, j0:j1]
+        iIdx, jIdx = np.nonzero(window)
+        spots = self.spotsOf(iIdx + i0, jIdx + j0)
+        return [(model, x, y) for model, (x, y) in zip(window[iIdx, jIdx].tolist(), spots)]
+
+    def landingsIn(self, i0, i1, j0, j1):
+        # [(x, y)] of the landing spots in the blocks [i0, i1) x [j0, j1)
+        iIdx, jIdx = np.nonzero(self.cells[i0:i1, j0:j1] == 0)
+        return self.spotsOf(iIdx + i0, jIdx + j0)
+
+    def toDict(self):
+        packed = base64.b64encode(zlib.compress(self.cells.tobytes())).decode("ascii")
+        return {"version": self.VERSION,
+                "seed": self.seed,
+                "sizeX": self.sizeX,
+                "sizeY": self.sizeY,
+                "cells": {"shape": list(self.cells.shape), "data": packed},
+                "starts": {str(id): list(spot) for id, spot in self.starts.items()},
+                "packages": {str(id): [list(spot) for spot in spots] for id, spots in self.packages.items()}}
+
+    @classmethod
+    def fromDict(cls, desc):
+        if desc.get("version") != cls.VERSION:
+            raise ValueError(f"{cls.TAG}: unsupported version {desc.get('version')}")
+        shape = tuple(desc["cells"]["shape"])
+        raw = zlib.decompress(base64.b64decode(desc["cells"]["data"]))
+        cells = np.frombuffer(raw, dtype = np.uint8).reshape(shape).copy()
+        return Scenario(desc["seed"], desc["sizeX"], desc["sizeY"], cells,
+                        {int(id): tuple(spot) for id, spot in desc["starts"].items()},
+                        {int(id): [tuple(spot) for spot in spots] for id, spots in desc["packages"].items()})
+
+    def save(self, path):
+        with open(path, "w") as fp:
+            json.dump(self.toDict(), fp)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fp:
+            return cls.fromDict(json.load(fp))
+
+    def __eq__(self, other):
+        return isinstance(other, Scenario) and self.toDict() == other.toDict()
+
+
+if __name__ == "__main__":
+    # one seed, one world; a saved scenario loads back unchanged; the
+    # vectorised layout against the per block Python loop it replaced
+    import os
+    import tempfile
+    import time
+    items = {0: 15, 1: 15}
+    first = Scenario.generate(42, 50, 50, items)
+    assert first == Scenario.generate(42, 50, 50, items)
+    assert first != Scenario.generate(43, 50, 50, items)
+    nx, ny = first.cells.shape
+    landings = first.landingsIn(0, nx, 0, ny)
+    buildings = first.buildingsIn(0, nx, 0, ny)
+    assert len(landings) + len(buildings) == nx * ny
+    used = [first.starts[id] for id in items] + [spot for id in items for spot in first.packages[id]]
+    assert len(set(used)) == len(used) and set(used) <= set(landings)
+    assert all(first.cells[first.cellOf(x, y)] == model for model, x, y in buildings)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scenario.json")
+        first.save(path)
+        assert Scenario.load(path) == first
+        size = os.path.getsize(path)
+    print(f"seed 42: {len(buildings)} buildings, {len(landings)} landing spots, starts {first.starts}, {size} bytes as JSON")
+
+    sizeX = sizeY = 2500
+    then = time.perf_counter()
+    big = Scenario.generate(7, sizeX, sizeY, items)
+    bigSecs = time.perf_counter() - then
+    rng = random.Random(7)
+    then = time.perf_counter()
+    loopCells = []
+    for gridX in range(-sizeX, sizeX, Scenario.BLOCK):
+        for gridY in range(-sizeY, sizeY, Scenario.BLOCK):
+            bldType = rng.randint(1, Scenario.NUM_MODELS)
+            loopCells.append(bldType if rng.randint(0, 1) == 1 else 0)
+    loopSecs = time.perf_counter() - then
+    print(f"{big.cells.shape[0]}x{big.cells.shape[1]} blocks: vectorised {bigSecs * 1e3:.1f} ms, Python loop {loopSecs * 1e3:.1f} ms")
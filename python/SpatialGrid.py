@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import math
+
+class SpatialGrid:
+    '''
+    Uniform grid over the XY plane for landing pads and package locations.
+    Points are keyed by (x, y), so two points can't share a spot. Cells are
+    a dict of cellSize squares, which makes add/remove O(1), with a dense
+    list of every point next to them (swap-remove keeps that O(1) too).
+    nearest() and kNearest() search outwards ring by ring and stop once no
+    farther ring can hold anything closer; within() only visits the cells
+    the circle touches. Distances are in the XY plane, like the scans they
+    replace. items is the dense list itself: callers may hold on to it as a
+    live, read-only view of the points, in no particular order.
+    '''
+    CELL_SIZE = 30.0
+
+    def __init__(self, points = (), cellSize = CELL_SIZE):
+        self.cellSize = cellSize
+        self.cells = {}
+        self.items = []
+        self.slots = {}
+        self.lo = None
+        self.hi = None
+        for pos in points:
+            self.add(pos)
+
+    def cellOf(self, x, y):
+        return (math.floor(x / self.cellSize), math.floor(y / self.cellSize))
+
+    def add(self, pos):
+        key = (pos.x, pos.y)
+        if key in self.slots:
+            return False
+        cell = self.cellOf(pos.x, pos.y)
+        self.cells.setdefault(cell, {})[key] = pos
+        self.slots[key] = (len(self.items), cell)
+        self.items.append(pos)
+        if self.lo is None:
+            self.lo, self.hi = cell, cell
+        else:
+            self.lo = (min(self.lo[0], cell[0]), min(self.lo[1], cell[1]))
+            self.hi = (max(self.hi[0], cell[0]), max(self.hi[1], cell[1]))
+        return True
+
+    def remove(self, pos):
+        key = (pos.x, pos.y)
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return False
+        idx, cell = slot
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+        last = self.items.pop()
+        if idx < len(self.items):
+            self.items[idx] = last
+            lastKey = (last.x, last.y)
+            self.slots[lastKey] = (idx, self.slots[lastKey][1])
+        return True
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+    def __contains__(self, pos):
+        return (pos.x, pos.y) in self.slots
+
+    def indexOf(self, pos):
+        # position of pos in items, None if absent
+        slot = self.slots.get((pos.x, pos.y))
+        return None if slot is None else slot[0]
+
+    def get(self, pos):
+        # the stored point at exactly pos.xy
+        slot = self.slots.get((pos.x, pos.y))
+        return None if slot is None else self.items[slot[0]]
+
+    def maxRing(self, cell):
+        if self.lo is None:
+            return -1
+        return max(cell[0] - self.lo[0], self.hi[0] - cell[0], cell[1] - self.lo[1], self.hi[1] - cell[1])
+
+    def ring(self, cell, r):
+        cx, cy = cell
+        if r == 0:
+            yield cell
+            return
+        for dx in range(-r, r + 1):
+            yield (cx + dx, cy - r)
+            yield (cx + dx, cy + r)
+        for dy in range(-r + 1, r):
+            yield (cx - r, cy + dy)
+            yield (cx + r, cy + dy)
+
+    def nearest(self, pos, maxDist = math.inf):
+        # closest point strictly within maxDist, or None
+        found = self.kNearest(pos, 1, maxDist)
+        return found[0] if found else None
+
+    def kNearest(self, pos, k, maxDist = math.inf):
+        # up to k points strictly within maxDist, closest first
+        cell = self.cellOf(pos.x, pos.y)
+        limit = maxDist * maxDist
+        found = []
+        for r in range(self.maxRing(cell) + 1):
+            # everything closer than r * cellSize is in rings 0..r
+            if (r - 1) * self.cellSize >= maxDist:
+                break
+            for c in self.ring(cell, r):
+                bucket = self.cells.get(c)
+                if bucket is None:
+                    continue
+                for pt in bucket.values():
+                    dx = pt.x - pos.x
+                    dy = pt.y - pos.y
+                    d2 = dx * dx + dy * dy
+                    if d2 < limit:
+                        found.append((d2, pt))
+            if len(found) >= k:
+                found.sort(key = lambda item: item[0])
+                del found[k:]
+                reach = r * self.cellSize
+                if found[-1][0] < reach * reach:
+                    break
+        found.sort(key = lambda item: item[0])
+        return [pt for _, pt in found[:k]]
+
+    def within(self, pos, radius):
+        # every point strictly within radius, unordered
+        lo = self.cellOf(pos.x - radius, pos.y - radius)
+        hi = self.cellOf(pos.x + radius, pos.y + radius)
+        r2 = radius * radius
+        found = []
+        for cx in range(lo[0], hi[0] + 1):
+            for cy in range(lo[1], hi[1] + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket is None:
+                    continue
+                for pt in bucket.values():
+                    dx = pt.x - pos.x
+                    dy = pt.y - pos.y
+                    if dx * dx + dy * dy < r2:
+                        found.append(pt)
+        return found
+
+
+if __name__ == "__main__":
+    # queries against brute force scans over a 500x500 world
+    import random
+    import time
+    from panda3d.core import Vec3
+
+    def dist(a, b):
+        return math.hypot(a.x - b.x, a.y - b.y)
+
+    rng = random.Random(11)
+    pts = [Vec3(rng.randrange(-250, 250), rng.randrange(-250, 250), 0) for _ in range(3000)]
+    pts = list({(p.x, p.y): p for p in pts}.values())
+    grid = SpatialGrid(pts)
+    for _ in range(len(pts) // 3):
+        grid.remove(pts.pop(rng.randrange(len(pts))))
+    assert len(grid) == len(pts) and all(p in grid for p in pts)
+    probes = [Vec3(rng.uniform(-300, 300), rng.uniform(-300, 300), 0) for _ in range(500)]
+    then = time.perf_counter()
+    for q in probes:
+        near = grid.nearest(q)
+        knn = grid.kNearest(q, 5)
+        rad = grid.within(q, 40.0)
+    gridSecs = time.perf_counter() - then
+    then = time.perf_counter()
+    for q in probes:
+        closest = min(pts, key = lambda p: dist(p, q))
+        inside = [p for p in pts if dist(p, q) < 40.0]
+    scanSecs = time.perf_counter() - then
+    for q in probes:
+        byDist = sorted(pts, key = lambda p: dist(p, q))
+        assert dist(grid.nearest(q), q) == dist(byDist[0], q)
+        assert [dist(p, q) for p in grid.kNearest(q, 5)] == [dist(p, q) for p in byDist[:5]]
+        assert sorted(dist(p, q) for p in grid.within(q, 40.0)) == [dist(p, q) for p in byDist if dist(p, q) < 40.0]
+    assert grid.nearest(Vec3(1000, 1000, 0), 100.0) is None
+    print(f"{len(pts)} points, {len(probes)} probes: grid {gridSecs * 1e3:.1f} ms (nearest, 5 nearest, radius 40), linear scans {scanSecs * 1e3:.1f} ms (nearest, radius 40)")
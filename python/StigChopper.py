@@ -9,6 +9,7 @@ from panda3d.core import CollisionTraverser, CollisionHandlerPusher
 from direct.showbase.ShowBase import ShowBase
 
 from BaseObject import *
+from SpatialGrid import SpatialGrid
 import random
 
 class StigChopper(BaseObject):
@@ -43,14 +44,27 @@ class StigChopper(BaseObject):
         self.landed = True
 
         self.homeBase = pos
-        self.targetWaypoints = []
+        self.waypointGrid = SpatialGrid()
+        self.targetWaypoints = self.waypointGrid.items
         self.id = id
+        # physics poses before and after the last step, for rendering in between
+        self.prevPos = None
+        self.prevHpr = None
+        self.curPos = None
+        self.curHpr = None
 
     def setWaypoints(self, wp):
         for point in wp:
             base.addLandingPad(self.id, point)
 
-        self.targetWaypoints = wp
+        # targetWaypoints is the grid's own list, removals keep it current
+        self.waypointGrid = SpatialGrid(wp)
+        self.targetWaypoints = self.waypointGrid.items
+
+    def removeWaypoint(self, pos):
+        # delivered: drop just this point and its pad, O(1)
+        base.removeLandingPad(pos)
+        return self.waypointGrid.remove(pos)
     
     def fuelCapacity(self):
         return self.m_fuelCapacity
@@ -79,11 +93,36 @@ class StigChopper(BaseObject):
             if not self.rotorPath is None:
                 self.rotorPath.setHpr(random.randint(0,359),0.0, 0.0)
             '''
-            self.actor.setPos(Vec3(myPos.x, myPos.y, myPos.z + self.VERT_OFFSET))
             rotation = base.transformations(self.id)
-            self.actor.setHpr(Vec3(rotation.x - 90.0,rotation.y, rotation.z))
+            self.prevPos = self.curPos
+            self.prevHpr = self.curHpr
+            self.curPos = Vec3(myPos.x, myPos.y, myPos.z + self.VERT_OFFSET)
+            self.curHpr = Vec3(rotation.x - 90.0,rotation.y, rotation.z)
+            if base.headless:
+                # no frames to interpolate() between, the actor and its
+                # collider follow the physics every step
+                self.actor.setPos(self.curPos)
+                self.actor.setHpr(self.curHpr)
 
         self.runLogic(currentTime,elapsedTime)
 
+    def interpolate(self, alpha):
+        # alpha is the fraction of a physics step elapsed since the last one
+        if self.curPos is None:
+            return
+        if self.prevPos is None:
+            self.actor.setPos(self.curPos)
+            self.actor.setHpr(self.curHpr)
+            return
+        self.actor.setPos(self.prevPos + (self.curPos - self.prevPos) * alpha)
+        dH = self.curHpr.x - self.prevHpr.x
+        if dH > 180.0:
+            dH -= 360.0
+        elif dH < -180.0:
+            dH += 360.0
+        hpr = self.prevHpr + (self.curHpr - self.prevHpr) * alpha
+        hpr.x = self.prevHpr.x + dH * alpha
+        self.actor.setHpr(hpr)
+
     def runLogic(self,dt,tick):
         pass
\ No newline at end of file
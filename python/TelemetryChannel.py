@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import collections
+import socket
+import threading
+import time
+
+import TelemetrySchema
+
+MCAST_GRP = '224.0.0.1'
+MULTICAST_TTL = 2
+
+class TelemetryChannel:
+    '''
+    Buffered multicast sender shared by every state machine on a port.
+    post() only appends the encoded record (see TelemetrySchema) to a bounded
+    ring buffer; a daemon thread packs the pending records, length prefixed,
+    into datagrams of at most MAX_DATAGRAM bytes and sends them. When the buffer is full the oldest
+    low priority record is dropped first, then the oldest high priority one.
+    '''
+    TAG = "TelemetryChannel"
+
+    HIGH = 0
+    LOW = 1
+
+    MAX_DATAGRAM = 1400
+    CAPACITY = 4096
+    FLUSH_SECS = 0.02
+    WAKE_RECORDS = 64
+
+    channels = {}
+    channelsLock = threading.Lock()
+
+    @classmethod
+    def get(cls, port, group = MCAST_GRP):
+        with cls.channelsLock:
+            key = (group, port)
+            if key not in cls.channels:
+                cls.channels[key] = TelemetryChannel(group, port)
+            return cls.channels[key]
+
+    @classmethod
+    def closeAll(cls):
+        with cls.channelsLock:
+            channels = list(cls.channels.values())
+            cls.channels.clear()
+        for chan in channels:
+            chan.close()
+
+    def __init__(self, group, port, capacity = CAPACITY):
+        self.addr = (group, port)
+        self.capacity = capacity
+        self.high = collections.deque()
+        self.low = collections.deque()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.quit = False
+        self.posted = 0
+        self.sentRecords = 0
+        self.datagrams = 0
+        self.droppedLow = 0
+        self.droppedHigh = 0
+        self.sendErrors = 0
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+        except Exception as ex:
+            print(f"{self.TAG}: can't create socket for {self.addr}: {ex}")
+            self.sock = None
+        self.thread = threading.Thread(target = self.flushThread, name = f"telemetry-{port}", daemon = True)
+        self.thread.start()
+
+    def post(self, msg, prio = HIGH):
+        with self.lock:
+            self.posted += 1
+            if len(self.high) + len(self.low) >= self.capacity:
+                if self.low:
+                    self.low.popleft()
+                    self.droppedLow += 1
+                elif prio == self.LOW:
+                    self.droppedLow += 1
+                    return
+                else:
+                    self.high.popleft()
+                    self.droppedHigh += 1
+            if prio == self.LOW:
+                self.low.append(msg)
+            else:
+                self.high.append(msg)
+            pending = len(self.high) + len(self.low)
+        if pending >= self.WAKE_RECORDS:
+            self.wake.set()
+
+    def pending(self):
+        with self.lock:
+            return len(self.high) + len(self.low)
+
+    def stats(self):
+        with self.lock:
+            return {"posted": self.posted,
+                    "sent": self.sentRecords,
+                    "datagrams": self.datagrams,
+                    "droppedLow": self.droppedLow,
+                    "droppedHigh": self.droppedHigh,
+                    "sendErrors": self.sendErrors,
+                    "pending": len(self.high) + len(self.low)}
+
+    def takeBatch(self):
+        # drain up to one datagram worth of records, high priority first
+        batch = []
+        size = 0
+        with self.lock:
+            for q in (self.high, self.low):
+                while q:
+                    recLen = len(q[0]) + TelemetrySchema.LENGTH.size
+                    if batch and size + recLen > self.MAX_DATAGRAM:
+                        return batch
+                    batch.append(q.popleft())
+                    size += recLen
+        return batch
+
+    def flush(self):
+        while True:
+            batch = self.takeBatch()
+            if not batch:
+                break
+            sent = 0
+            try:
+                if self.sock is not None:
+                    self.sock.sendto(TelemetrySchema.frame(batch), self.addr)
+                    sent = len(batch)
+            except Exception:
+                with self.lock:
+                    self.sendErrors += 1
+            with self.lock:
+                self.sentRecords += sent
+                self.datagrams += 1 if sent else 0
+
+    def flushThread(self):
+        while not self.quit:
+            self.wake.wait(self.FLUSH_SECS)
+            self.wake.clear()
+            self.flush()
+        self.flush()
+
+    def close(self):
+        self.quit = True
+        self.wake.set()
+        self.thread.join(1.0)
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def splitRecords(data):
+    # receivers: one datagram carries several length prefixed records
+    return [TelemetrySchema.decode(rec) for rec in TelemetrySchema.unframe(data)]
+
+
+if __name__ == "__main__":
+    # loopback check: post a burst and count what arrives on the group
+    import struct
+    port = 50009
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    rx.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    rx.bind(('', port))
+    rx.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, struct.pack("4sl", socket.inet_aton(MCAST_GRP), socket.INADDR_ANY))
+    rx.settimeout(0.5)
+    chan = TelemetryChannel.get(port)
+    numRecs = 20000
+    start = time.perf_counter()
+    for idx in range(numRecs):
+        rec = TelemetrySchema.encode(TelemetrySchema.POS, 1, 104, idx * 0.02, "TICK", idx, 0.0, 67.0, 100.0, 100.0, 67.0, 1.0, 0.0, 0.0, 0.1, 0.088, 45.0)
+        chan.post(rec, TelemetryChannel.LOW if idx % 2 else TelemetryChannel.HIGH)
+    postSecs = time.perf_counter() - start
+    received = 0
+    try:
+        while True:
+            data, addr = rx.recvfrom(2048)
+            received += len(splitRecords(data))
+    except socket.timeout:
+        pass
+    TelemetryChannel.closeAll()
+    print(f"post: {postSecs / numRecs * 1e6:.2f} us/record, received {received}, stats: {chan.stats()}")
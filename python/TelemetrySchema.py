@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import struct
+from collections import namedtuple
+
+# Binary telemetry records. Every record is a fixed header
+#   version (u8), type (u8), chopper id (u16), state (u16), sim time (f64)
+# followed by a body whose layout depends on the type. TEXT and DEBUG carry
+# UTF-8 text, the rest are packed float32 fields. The controller dumps (POS,
+# ALT, HEAD, VEL) start with the source that called dump(), a NUL padded
+# 8 byte label such as "TICK" or "SET HDG". Records travel inside
+# datagrams with a u16 length prefix each (see TelemetryChannel).
+
+VERSION = 2
+
+HEADER = struct.Struct("<BBHHd")
+LENGTH = struct.Struct("<H")
+
+TEXT = 0
+START = 1
+POS = 2
+ALT = 3
+HEAD = 4
+VEL = 5
+FUEL = 6
+PACKAGES = 7
+POINT = 8
+DEBUG = 9
+
+# POINT kinds
+ORIG_SET = 0
+TSM_PATH = 1
+
+Header = namedtuple("Header", "version type chopperId state simTime")
+Record = namedtuple("Record", "header data")
+
+PosData = namedtuple("PosData", "source curX curY curZ trgX trgY trgZ dist facing head speed maxAccel trgHdg")
+AltData = namedtuple("AltData", "source trg act trgRate actRate accel error integral deriv takeOffSpd actRotSpd desRotSpd")
+HeadData = namedtuple("HeadData", "source trg act dA desRotSpd actRotSpd integral deriv dt elapsed")
+VelData = namedtuple("VelData", "source dt trg speed desTilt actTilt error integral deriv facing velHeading "
+                                "lstX lstY lstZ curX curY curZ dirX dirY dirZ")
+FuelData = namedtuple("FuelData", "remaining_kg percent")
+PackagesData = namedtuple("PackagesData", "count")
+PointData = namedtuple("PointData", "kind x y z")
+DebugData = namedtuple("DebugData", "slot text")
+
+BODIES = {
+    START: (struct.Struct("<"), None),
+    POS: (struct.Struct("<8s12f"), PosData),
+    ALT: (struct.Struct("<8s11f"), AltData),
+    HEAD: (struct.Struct("<8s9f"), HeadData),
+    VEL: (struct.Struct("<8s19f"), VelData),
+    FUEL: (struct.Struct("<2f"), FuelData),
+    PACKAGES: (struct.Struct("<H"), PackagesData),
+    POINT: (struct.Struct("<B3f"), PointData),
+}
+DEBUG_SLOT = struct.Struct("<B")
+LABELLED = (POS, ALT, HEAD, VEL)
+
+
+def worldTime():
+    # sim time of the running world, 0 outside of one
+    try:
+        return base.curTimeStamp
+    except (NameError, AttributeError):
+        return 0.0
+
+
+def encode(recType, chopperId, state, simTime, *fields):
+    head = HEADER.pack(VERSION, recType, chopperId, state, simTime)
+    if recType == TEXT:
+        return head + str(fields[0]).encode()
+    if recType == DEBUG:
+        return head + DEBUG_SLOT.pack(fields[0]) + str(fields[1]).encode()
+    if recType in LABELLED:
+        fields = (str(fields[0]).encode(),) + fields[1:]
+    return head + BODIES[recType][0].pack(*fields)
+
+
+def decode(rec):
+    header = Header._make(HEADER.unpack_from(rec))
+    if header.version != VERSION:
+        raise ValueError(f"telemetry version {header.version}, expected {VERSION}")
+    body = memoryview(rec)[HEADER.size:]
+    if header.type == TEXT:
+        data = bytes(body).decode(errors = "replace")
+    elif header.type == DEBUG:
+        data = DebugData(body[0], bytes(body[DEBUG_SLOT.size:]).decode(errors = "replace"))
+    else:
+        layout, fields = BODIES[header.type]
+        values = layout.unpack(body)
+        if header.type in LABELLED:
+            values = (values[0].rstrip(b"\0").decode(errors = "replace"),) + values[1:]
+        data = fields._make(values) if fields is not None else None
+    return Record(header, data)
+
+
+def frame(records):
+    return b"".join(LENGTH.pack(len(rec)) + rec for rec in records)
+
+
+def unframe(data):
+    records = []
+    offset = 0
+    while offset + LENGTH.size <= len(data):
+        size, = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        records.append(data[offset:offset + size])
+        offset += size
+    return records
+
+
+if __name__ == "__main__":
+    # round trip and size against the old text form of the position dump
+    pos = (12.5, -40.25, 67.0, 100.0, 220.5, 67.0, 210.3, 45.0, 44.5, 0.125, 0.088, 47.0)
+    rec = encode(POS, 3, 104, 812.44, "pos", *pos)
+    back = decode(rec)
+    text = "104> pos       , cur   :( 12.5000, -40.2500,  67.0000)|, trg   :( 100.0000,  220.5000,  67.0000)|, dist: 210.3000,facing: 45.0000," \
+           "head: 44.5000, speed:  0.12500000,maxAccel:  0.0880, trgHdg:  47.0000"
+    same = back.data.source == "pos" and all(abs(a - b) < 1e-3 for a, b in zip(pos, back.data[1:]))
+    print(f"{back.header}, fields equal: {same}, binary {len(rec)} bytes vs text {len(text)} bytes")
+    assert same
+    assert decode(encode(TEXT, 1, 2, 3.0, "hello")).data == "hello"
+    assert decode(encode(DEBUG, 1, 2, 3.0, 1, "done")).data == DebugData(1, "done")
+    assert [decode(r).header.type for r in unframe(frame([rec, encode(START, 1, 100, 0.0)]))] == [POS, START]
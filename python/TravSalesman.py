@@ -1,29 +1,51 @@
-import threading
 import itertools
 import math
-import os
-from multiprocessing import Process
-import multiprocessing as mp
 import time
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
 import numpy as np
-import gc
 
 from panda3d.core import Vec2, Vec3
 
+from PlannerService import PlannerService
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        return wrap
+
+# edge score: turn / HDG_DIV + distance / DIST_DIV, scaled up for long legs
+# and down for short ones. SCORE_PARAMS goes into the RouteCache key.
+HDG_DIV = 16.2
+DIST_DIV = 550.0
+LONG_DIST = 310.0
+LONG_MULT = 1.7
+SHORT_DIST = 36.0
+SHORT_MULT = 0.7
+SCORE_PARAMS = (HDG_DIV, DIST_DIV, LONG_DIST, LONG_MULT, SHORT_DIST, SHORT_MULT)
 
 def calcScore(preHdg, p1, p2):
     diff = (p1 - p2)
     trgHdg = math.atan2(diff.y,diff.x)
     hdg = abs(trgHdg - preHdg)
     dist = diff.length()
-    score = hdg / 16.2 + dist / 550.0
-    if dist > 310.0:
-        score *= 1.7
-    elif dist < 36.0:
-        score *= 0.7
+    score = hdg / HDG_DIV + dist / DIST_DIV
+    if dist > LONG_DIST:
+        score *= LONG_MULT
+    elif dist < SHORT_DIST:
+        score *= SHORT_MULT
     return trgHdg, score
 
 def calcTotalScore(combo3, lowScore, cp2, wps):
+    # reference scoring with calcScore per edge; the planner scores through
+    # ScoreTable, which has to agree with this
     combo = []
     for ptIdx in combo3:
         cmb = wps[ptIdx]
@@ -36,33 +58,468 @@ def calcTotalScore(combo3, lowScore, cp2, wps):
             if score >= lowScore: break
     return score
 
-def proc_calculate(idx,sz,mx,datQueue, resQueue):
-    #print(f"Thread {idx}, processing {len(lst):,} entries ")
-    wps = []
-    while not datQueue.empty():
-        wps.append(datQueue.get())
-    cp2 = wps[-1]
-    wps.remove(cp2)
-    then = time.time_ns()
-    idxArr = np.arange(sz,dtype=np.int8)
-    allItr = itertools.permutations(idxArr,len(idxArr))
-    lowScore = 1e9
-    lowCombo = None
-    num = 0
-    cnt = 0
-    for combo in allItr:
-        if (num % mx) == idx:
-            score = calcTotalScore(combo,lowScore,cp2, wps)
-            cnt += 1
-            #print(f"Scoore: {score} for {combo}                   ",end='\r')
-            if score < lowScore:
-                lowScore = score
-                lowCombo = combo
-        num += 1
-    resQueue.put((lowScore,lowCombo))
-    now = time.time_ns()
-    dt = (now - then) * 1e-9
-    print(f"Thread {idx} ========= DONE: low score {lowScore}, combo: {lowCombo}; proc {cnt:,} entries in {dt: >.2f} secs")
+# Largest waypoint set solved exactly; the Held-Karp table grows as
+# 2^n * (n+1) * n entries, about 63 MB of float64 at 15 points.
+HK_MAX_POINTS = 15
+HK_CHUNK = 1024
+# permutations scored per batch by ScoreTable.bruteForce
+BATCH_SIZE = 40320
+
+class ScoreTable:
+    '''
+    calcScore for every edge, built once per determine() call.
+    T[a, b, c] is the score of the edge b->c flown after the edge a->b; index n
+    stands for the start position. first[c] is the opening edge, scored
+    against a previous heading of 0 as calcTotalScore does. Tours are then
+    scored by table lookups, one at a time or as a batch of rows.
+    fromPoint() cuts the table for the rest of a tour out of this one.
+    '''
+    def __init__(self, cp2, wps):
+        n = len(wps)
+        pts = np.array([[pt.x, pt.y] for pt in wps] + [[cp2.x, cp2.y]], dtype=np.float64)
+        diff = pts[:, None, :] - pts[None, :, :]
+        hdg = np.arctan2(diff[..., 1], diff[..., 0])
+        dist = np.hypot(diff[..., 0], diff[..., 1])
+        mult = np.where(dist > LONG_DIST, LONG_MULT, np.where(dist < SHORT_DIST, SHORT_MULT, 1.0))
+        self.n = n
+        self.T = (np.abs(hdg[None, :, :] - hdg[:, :, None]) / HDG_DIV + dist[None, :, :] / DIST_DIV) * mult[None, :, :]
+        # every edge flown from a previous heading of 0, first is the start's row
+        self.opening = (np.abs(hdg) / HDG_DIV + dist / DIST_DIV) * mult
+        self.first = self.opening[n, :n]
+
+    def fromPoint(self, start, keep):
+        # the table for flying the points keep from the point start, both
+        # indexes here: rows of this table, nothing recomputed
+        idx = np.append(np.asarray(keep, dtype=np.int64), start)
+        table = ScoreTable.__new__(ScoreTable)
+        table.n = len(idx) - 1
+        table.T = self.T[np.ix_(idx, idx, idx)]
+        table.opening = self.opening[np.ix_(idx, idx)]
+        table.first = table.opening[table.n, :table.n]
+        return table
+
+    def score(self, order):
+        order = np.asarray(order, dtype=np.int64)
+        if len(order) == 0:
+            return 0.0
+        prev = np.concatenate(([self.n], order[:-2]))
+        return float(self.first[order[0]] + self.T[prev, order[:-1], order[1:]].sum())
+
+    def scores(self, orders):
+        # one score per row of orders
+        orders = np.asarray(orders, dtype=np.int64)
+        if orders.shape[1] == 0:
+            return np.zeros(len(orders))
+        prev = np.concatenate((np.full((len(orders), 1), self.n), orders[:, :-2]), axis=1)
+        return self.first[orders[:, 0]] + self.T[prev, orders[:, :-1], orders[:, 1:]].sum(axis=1)
+
+    def bruteForce(self, batchSize = BATCH_SIZE):
+        perms = itertools.permutations(range(self.n))
+        bestScore, bestOrder = np.inf, ()
+        while True:
+            batch = np.array(list(itertools.islice(perms, batchSize)), dtype=np.int64)
+            if len(batch) == 0:
+                break
+            sc = self.scores(batch)
+            idx = int(np.argmin(sc))
+            if sc[idx] < bestScore:
+                bestScore, bestOrder = float(sc[idx]), tuple(int(c) for c in batch[idx])
+        return bestScore, bestOrder
+
+@njit(cache=True)
+def heldKarpKernel(T, first, n):
+    F = np.full((1 << n, n + 1, n), np.inf)
+    for c in range(n):
+        F[1 << c, n, c] = first[c]
+    for mask in range(1, 1 << n):
+        for c in range(n):
+            if not (mask >> c) & 1:
+                continue
+            for b in range(n + 1):
+                val = F[mask, b, c]
+                if val == np.inf:
+                    continue
+                for d in range(n):
+                    if (mask >> d) & 1:
+                        continue
+                    cand = val + T[b, c, d]
+                    if cand < F[mask | (1 << d), c, d]:
+                        F[mask | (1 << d), c, d] = cand
+    return F
+
+def heldKarpTables(T, first, n):
+    # same recurrence layer by layer in NumPy, float32 to halve the traffic
+    full = 1 << n
+    Tn = np.ascontiguousarray(T[:, :n, :n], dtype=np.float32)
+    F = np.full((full, n + 1, n), np.inf, dtype=np.float32)
+    for c in range(n):
+        F[1 << c, n, c] = first[c]
+    masks = np.arange(full)
+    bits = np.zeros(full, dtype=np.int8)
+    for i in range(n):
+        bits += ((masks >> i) & 1).astype(np.int8)
+    for k in range(1, n):
+        layer = masks[bits == k]
+        for start in range(0, len(layer), HK_CHUNK):
+            chunk = layer[start:start + HK_CHUNK]
+            best = (F[chunk][:, :, :, None] + Tn[None]).min(axis=1)
+            for d in range(n):
+                src = np.flatnonzero(((chunk >> d) & 1) == 0)
+                F[chunk[src] | (1 << d), :n, d] = best[src, :, d]
+    return F
+
+def heldKarp(table):
+    # exact: F[mask, b, c] is the best score for visiting mask from the start
+    # and ending with the edge b->c (b == n when c is the first point)
+    n = table.n
+    if n == 0:
+        return 0.0, ()
+    T, first = table.T, table.first
+    if HAVE_NUMBA:
+        F = heldKarpKernel(T, first, n)
+    else:
+        F = heldKarpTables(T, first, n)
+    mask = (1 << n) - 1
+    b, c = np.unravel_index(np.argmin(F[mask]), F[mask].shape)
+    order = [int(c)]
+    # walk back: the predecessor edge a->b is the one that explains F[mask, b, c]
+    while b != n:
+        mask ^= 1 << int(c)
+        a = int(np.argmin(F[mask, :, b] + T[:, b, c]))
+        b, c = a, b
+        order.append(int(c))
+    order.reverse()
+    return table.score(order), tuple(order)
+
+def greedyTour(table):
+    n = table.n
+    if n == 0:
+        return []
+    left = set(range(n))
+    order = [int(np.argmin(table.first))]
+    left.remove(order[0])
+    prev = n
+    while left:
+        cur = order[-1]
+        nxt = min(left, key=lambda c: table.T[prev, cur, c])
+        order.append(nxt)
+        left.remove(nxt)
+        prev = cur
+    return order
+
+def tourMoves(n):
+    # every 2-opt reversal and Or-opt move of 1-3 points, as rows of source
+    # positions: candidate = order[moves[m]]
+    pos = np.arange(n)
+    moves = []
+    if n >= 2:
+        I, J = np.triu_indices(n, 1)
+        I, J = I[:, None], J[:, None]
+        moves.append(np.where((pos >= I) & (pos <= J), I + J - pos, pos))
+    for segLen in (1, 2, 3):
+        if segLen >= n:
+            break
+        I, J = np.meshgrid(np.arange(n - segLen + 1), np.arange(n - segLen + 1), indexing="ij")
+        keep = I != J
+        I, J = I[keep][:, None], J[keep][:, None]
+        restPos = np.where(pos < J, pos, pos - segLen)
+        fromRest = np.where(restPos < I, restPos, restPos + segLen)
+        moves.append(np.where((pos >= J) & (pos < J + segLen), I + pos - J, fromRest))
+    if not moves:
+        return np.zeros((0, n), dtype=np.int64)
+    return np.concatenate(moves)
+
+def improveTour(table, order):
+    # take the best of all 2-opt and Or-opt moves, scored as one batch, until
+    # none of them helps
+    order = np.asarray(order, dtype=np.int64)
+    best = table.score(order)
+    moves = tourMoves(len(order))
+    while len(moves):
+        cands = order[moves]
+        sc = table.scores(cands)
+        idx = int(np.argmin(sc))
+        if sc[idx] >= best - 1e-12:
+            break
+        order, best = cands[idx], float(sc[idx])
+    return best, tuple(int(c) for c in order)
+
+# Above HK_MAX_POINTS: branch and bound, split by the first two stops across
+# the PlannerService pool. Each prefix gets a node budget so a search that
+# can't finish still returns the best tour it found. A task takes
+# BB_PREFIXES_PER_TASK prefixes, dealt out most promising first: a task per
+# prefix is n * (n - 1) jobs to submit and call back, and that Python work
+# competes with the simulation thread.
+BB_NODE_BUDGET = 2000000
+BB_TIME_BUDGET = 2.0
+BB_POLL_NODES = 1024
+BB_PREFIXES_PER_TASK = 16
+
+@njit(cache=True)
+def branchBoundKernel(T, first, minIn, prefix, shared, maxNodes):
+    # depth first over the tours starting with prefix; lower bound is the
+    # cheapest way into every stop not yet visited. shared[0] is the best
+    # score any worker has found, read every BB_POLL_NODES and lowered on
+    # each improvement; a negative value there stops the search.
+    n = len(first)
+    visited = np.zeros(n, dtype=np.bool_)
+    order = np.zeros(n, dtype=np.int64)
+    bestOrder = np.full(n, -1, dtype=np.int64)
+    costs = np.zeros(n + 1)
+    lbs = np.zeros(n + 1)
+    cand = np.zeros(n + 1, dtype=np.int64)
+    k0 = len(prefix)
+    cost = first[prefix[0]]
+    for i in range(k0):
+        order[i] = prefix[i]
+        visited[prefix[i]] = True
+        if i >= 1:
+            a = n if i == 1 else prefix[i - 2]
+            cost += T[a, prefix[i - 1], prefix[i]]
+    lb = 0.0
+    for c in range(n):
+        if not visited[c]:
+            lb += minIn[c]
+    best = shared[0]
+    found = np.inf
+    nodes = 0
+    if cost + lb >= best:
+        return found, bestOrder, True
+    costs[k0] = cost
+    lbs[k0] = lb
+    depth = k0
+    while depth >= k0:
+        if depth == n:
+            if costs[n] < best:
+                best = costs[n]
+                found = best
+                bestOrder[:] = order
+                if best < shared[0]:
+                    shared[0] = best
+            depth -= 1
+            if depth >= k0:
+                visited[order[depth]] = False
+            continue
+        nodes += 1
+        if nodes > maxNodes:
+            return found, bestOrder, False
+        if nodes % BB_POLL_NODES == 0 and shared[0] < best:
+            best = shared[0]
+            if best < 0.0:
+                return found, bestOrder, False
+        a = n if depth < 2 else order[depth - 2]
+        b = order[depth - 1]
+        advanced = False
+        c = cand[depth]
+        while c < n:
+            if not visited[c]:
+                newCost = costs[depth] + T[a, b, c]
+                newLb = lbs[depth] - minIn[c]
+                if newCost + newLb < best:
+                    cand[depth] = c + 1
+                    order[depth] = c
+                    visited[c] = True
+                    costs[depth + 1] = newCost
+                    lbs[depth + 1] = newLb
+                    cand[depth + 1] = 0
+                    depth += 1
+                    advanced = True
+                    break
+            c += 1
+        if not advanced:
+            cand[depth] = 0
+            depth -= 1
+            if depth >= k0:
+                visited[order[depth]] = False
+    return found, bestOrder, True
+
+gSearches = set()
+gSearchesLock = threading.Lock()
+gShared = {}
+
+def attachTables(shmName, n):
+    # worker side: map the tables once per shared block
+    if shmName not in gShared:
+        for old in gShared.values():
+            old[0].close()
+        gShared.clear()
+        shm = shared_memory.SharedMemory(name=shmName)
+        buf = np.ndarray((sharedSize(n),), dtype=np.float64, buffer=shm.buf)
+        T = buf[:(n + 1) ** 3].reshape(n + 1, n + 1, n + 1)
+        first = buf[(n + 1) ** 3:(n + 1) ** 3 + n]
+        minIn = buf[(n + 1) ** 3 + n:(n + 1) ** 3 + 2 * n]
+        gShared[shmName] = (shm, T, first, minIn, buf[-1:])
+    return gShared[shmName][1:]
+
+def sharedSize(n):
+    # T, first, minIn and the best score slot
+    return (n + 1) ** 3 + 2 * n + 1
+
+def proc_branchAndBound(shmName, n, prefixes, deadline, maxNodes):
+    T, first, minIn, shared = attachTables(shmName, n)
+    bestScore, bestOrder, complete = np.inf, None, True
+    for prefix in prefixes:
+        if time.time() > deadline or shared[0] < 0.0:
+            return bestScore, bestOrder, False
+        score, order, done = branchBoundKernel(T, first, minIn, np.array(prefix, dtype=np.int64), shared, maxNodes)
+        complete = complete and done
+        if order[0] >= 0 and score < bestScore:
+            bestScore, bestOrder = score, tuple(int(c) for c in order)
+    return bestScore, bestOrder, complete
+
+def proc_heldKarp(table):
+    score, order = heldKarp(table)
+    return score, order, True
+
+def closePool():
+    with gSearchesLock:
+        searches = list(gSearches)
+    for search in searches:
+        search.cancel()
+    PlannerService.closeAll()
+
+class RouteSearch:
+    '''
+    Exact route search run on the PlannerService pool without blocking the caller:
+    Held-Karp in one task up to HK_MAX_POINTS, prefix split branch and bound
+    above that. Completion comes back through future callbacks; the finished
+    search is put on the results queue (if one was given) for the simulation
+    loop to pick up, and wait() blocks on an event instead of polling.
+    cancel() drops the tasks not started yet and tells the running ones to
+    stop at their next poll of the shared bound. start() and cancel() can
+    hand their per task work to a thread, for the simulation loop.
+    '''
+    def __init__(self, table, score, order, results = None, budget = BB_TIME_BUDGET, maxNodes = BB_NODE_BUDGET,
+                 heldKarpMax = HK_MAX_POINTS, priority = PlannerService.NORMAL):
+        self.table = table
+        self.priority = priority
+        self.heldKarpMax = heldKarpMax
+        self.score = score
+        self.order = tuple(order)
+        self.results = results
+        self.budget = budget
+        self.maxNodes = maxNodes
+        self.exact = True
+        self.cancelled = False
+        self.futures = []
+        self.pending = 0
+        self.shm = None
+        self.shared = None
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+
+    def start(self, background = False):
+        # n * (n - 1) / BB_PREFIXES_PER_TASK tasks to submit above
+        # heldKarpMax: background leaves that to a thread of its own for
+        # callers that can't wait for it
+        if background and self.table.n > self.heldKarpMax:
+            threading.Thread(target = self.start, name = "route-search", daemon = True).start()
+            return self
+        n = self.table.n
+        pool = PlannerService.get()
+        deadline = time.time() + self.budget
+        if n <= self.heldKarpMax:
+            tasks = [(proc_heldKarp, (self.table,))]
+        else:
+            T, first = self.table.T, self.table.first
+            idx = np.arange(n)
+            inner = T[:, :n, :n].copy()
+            inner[idx, idx, :] = np.inf
+            inner[:, idx, idx] = np.inf
+            inner[idx, :, idx] = np.inf
+            minIn = np.minimum(inner.min(axis=(0, 1)), first)
+            size = sharedSize(n)
+            self.shm = shared_memory.SharedMemory(create=True, size=size * 8)
+            buf = np.ndarray((size,), dtype=np.float64, buffer=self.shm.buf)
+            buf[:T.size] = T.ravel()
+            buf[T.size:T.size + n] = first
+            buf[T.size + n:T.size + 2 * n] = minIn
+            self.shared = buf[-1:]
+            self.shared[0] = self.score
+            prefixes = [(a, b) for a in range(n) for b in range(n) if a != b]
+            prefixes.sort(key=lambda ab: first[ab[0]] + T[n, ab[0], ab[1]])
+            numTasks = -(-len(prefixes) // BB_PREFIXES_PER_TASK)
+            tasks = [(proc_branchAndBound, (self.shm.name, n, prefixes[idx::numTasks], deadline, self.maxNodes)) for idx in range(numTasks)]
+        with gSearchesLock:
+            gSearches.add(self)
+        with self.lock:
+            started = not self.cancelled
+            if started:
+                self.pending = len(tasks)
+                self.futures = [pool.submit(func, *args, priority = self.priority, deadline = deadline) for func, args in tasks]
+        if not started:
+            # cancelled before a background start got this far
+            self.release()
+            self.exact = False
+            self.finished.set()
+            return self
+        for future in self.futures:
+            future.add_done_callback(self.taskDone)
+        return self
+
+    def taskDone(self, future):
+        # runs on the executor's thread, or right away if already done
+        result = None
+        if not future.cancelled():
+            if future.exception() is None:
+                result = future.result()
+            else:
+                print(f"RouteSearch: worker failed: {future.exception()}")
+        with self.lock:
+            if result is None:
+                self.exact = False
+            else:
+                score, order, complete = result
+                self.exact = self.exact and complete
+                if order is not None and score < self.score:
+                    self.score, self.order = score, tuple(order)
+            self.pending -= 1
+            if self.pending > 0:
+                return
+        self.release()
+        if self.cancelled:
+            self.exact = False
+        elif self.results is not None:
+            self.results.put(self)
+        self.finished.set()
+
+    def release(self):
+        with gSearchesLock:
+            gSearches.discard(self)
+        with self.lock:
+            self.shared = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def cancel(self, background = False):
+        # the running tasks stop at once; background leaves dropping the
+        # queued ones, a call per task, to a thread
+        with self.lock:
+            self.cancelled = True
+            if self.shared is not None:
+                self.shared[0] = -1.0
+            futures = self.futures
+        if background and len(futures) > 1:
+            threading.Thread(target = self.cancel, name = "route-search-cancel", daemon = True).start()
+            return
+        for future in futures:
+            future.cancel()
+
+    def done(self):
+        return self.finished.is_set()
+
+    def wait(self, timeout = None):
+        self.finished.wait(timeout)
+        return self.score, self.order
+
+def parallelSolve(table, budget = BB_TIME_BUDGET, maxNodes = BB_NODE_BUDGET):
+    # blocking form, returns (score, order, exact)
+    score, order = improveTour(table, greedyTour(table))
+    search = RouteSearch(table, score, order, budget = budget, maxNodes = maxNodes, heldKarpMax = 0).start()
+    score, order = search.wait()
+    return table.score(order), tuple(order), search.exact
 
 class TravSalesman:
     wps = []
@@ -73,65 +530,45 @@ class TravSalesman:
     stop = False
     curPos = Vec3(0, 0, 0)
     cp2 = None
-    used = set()
     lowScore = 1e9
     lowScoreCombo = None
-    thrHndls = []
-    numThreads = 1
+    table = None
+    search = None
     curIdx = 0
 
     def __init__(self):
-        self.numThreads = int(os.cpu_count() * 0.9)
-        print(f"NUM THREADS: {self.numThreads}")
-        self.queue = None
-        self.lowScores = []
-        self.lowScoreCombos = []
         self.curIdx = 0
-        for _ in range(0,self.numThreads):
-            self.lowScores.append(1e9)
-            self.lowScoreCombos.append(None)
 
-    def determine(self, curPos, wps):
+    def determine(self, curPos, wps, results = None):
+        # starts the search on the worker pool and returns right away: the
+        # local search tour is the answer until the exact one comes back
+        self.cancel()
         self.done = False
         self.curPos = curPos
         self.cp2 = curPos.xy
         self.wps = wps
-        self.__init__()
-        self.thrHndls = []
-        sz = len(wps)
-        self.queue = mp.Queue()
-        for i in range(0,self.numThreads):
-            datQueue = mp.Queue()
-            for pt in self.wps:
-                datQueue.put(pt)
-            datQueue.put(self.cp2)
-            self.thrHndls.append(Process(target=proc_calculate,args=(i,sz,self.numThreads,datQueue,self.queue)))
-            self.thrHndls[-1].start()
+        self.curIdx = 0
+        self.then = time.time_ns()
+        self.table = ScoreTable(self.cp2, wps)
+        self.lowScore, self.lowScoreCombo = improveTour(self.table, greedyTour(self.table))
+        self.search = RouteSearch(self.table, self.lowScore, self.lowScoreCombo, results).start()
+
+    def cancel(self):
+        # waypoints changed: the running search is stale
+        if self.search is not None:
+            self.search.cancel()
+            self.search = None
 
     def allDone(self):
-        allDone = True
-        for t in self.thrHndls:
-            if t.is_alive():
-                allDone = False
-                break
-        return allDone
+        return self.search is None or self.search.done()
 
     def finish(self):
-        #print(f"Waiting for all to be done")
         if not self.done:
-            while(not self.allDone()):
-                pass
-            self.lowScore = 1e9
-            idx = 0
-            while not self.queue.empty():
-                sc, combo = self.queue.get()
-                #print(f" New low score of {sc} with {combo}")
-                if sc < self.lowScore:
-                    self.lowScore = sc
-                    self.lowScoreCombo = combo
-                idx += 1
+            if self.search is not None:
+                self.lowScore, self.lowScoreCombo = self.search.wait()
+                dt = (time.time_ns() - self.then) * 1e-9
+                print(f"{self.TAG}: {len(self.wps)} points, score {self.lowScore:.4f} in {dt: >.3f} secs")
             self.idx = self.lowScoreCombo
-            print("")
             print(f"====== the lowest score of {self.lowScore} of {self.lowScoreCombo}")
             print(f" Indexes: {self.idx}")
             self.done = True
@@ -144,7 +581,6 @@ class TravSalesman:
 
 if __name__ == '__main__':
     mp.freeze_support()
-    sm = TravSalesman()
     curPos = Vec3(60.0, 10.0, 0.0)
     wps = []
     wps.append(Vec3(-165.0, 10.0, 0.0))
@@ -156,16 +592,46 @@ if __name__ == '__main__':
     wps.append(Vec3(135.0, 10.0, 0.0))
     wps.append(Vec3(-215.0, 210.0, 0.0))
     wps.append(Vec3(135.0, 160.0, 0.0))
-    wps.append(Vec3(-65.0, -165.0, 0.0)) #completes in 9 secs
-    #wps.append(Vec3(-15.0, -140.0, 0.0)) #1.3min
-    #wps.append(Vec3(-140.0, 210.0, 0.0)) #19.9 min
-    '''
+    wps.append(Vec3(-65.0, -165.0, 0.0))
+    wps.append(Vec3(-15.0, -140.0, 0.0))
+    wps.append(Vec3(-140.0, 210.0, 0.0))
     wps.append(Vec3(-265.0, 210.0, 0.0))
     wps.append(Vec3(-90.0, -15.0, 0.0))
     wps.append(Vec3(135.0, -165.0, 0.0))
-    '''
-    res = sm.determine(curPos,wps)
-    for t in sm.thrHndls:
-        t.join()
+
+    # lookup scores against calcScore, then the exact solver against brute force
+    small = wps[:8]
+    table = ScoreTable(curPos.xy, small)
+    then = time.time()
+    bruteScore = 1e9
+    for combo in itertools.permutations(range(len(small))):
+        score = calcTotalScore(combo, bruteScore, curPos.xy, small)
+        if score < bruteScore:
+            bruteScore = score
+    refSecs = time.time() - then
+    then = time.time()
+    batchScore, batchCombo = table.bruteForce()
+    batchSecs = time.time() - then
+    perms = np.array(list(itertools.islice(itertools.permutations(range(len(small))), 0, None, 97)))
+    worst = max(abs(a - calcTotalScore(p, 1e9, curPos.xy, small)) for a, p in zip(table.scores(perms), perms))
+    print(f"8 points: calcScore brute force {bruteScore:.6f} in {refSecs:.2f} secs, batched lookups {batchScore:.6f} in {batchSecs:.2f} secs, worst difference {worst:.2e}")
+    hkScore, hkCombo = heldKarp(table)
+    print(f"8 points: held-karp {hkScore:.6f} {hkCombo}, rescored {calcTotalScore(hkCombo, 1e9, curPos.xy, small):.6f}")
+
+    sm = TravSalesman()
+    sm.determine(curPos, wps)
     sm.finish()
+    lsScore, lsCombo = improveTour(sm.table, greedyTour(sm.table))
+    print(f"15 points: local search alone {lsScore:.4f}")
 
+    # parallel branch and bound agrees with held-karp where both apply
+    table = ScoreTable(curPos.xy, wps[:12])
+    then = time.time()
+    bbScore, bbCombo, exact = parallelSolve(table)
+    print(f"12 points: branch and bound {bbScore:.6f} (exact {exact}) in {time.time() - then:.2f} secs, held-karp {heldKarp(table)[0]:.6f}")
+    wps.append(Vec3(-40.0, 85.0, 0.0))
+    wps.append(Vec3(210.0, -40.0, 0.0))
+    then = time.time()
+    bbScore, bbCombo, exact = parallelSolve(ScoreTable(curPos.xy, wps))
+    print(f"17 points: branch and bound {bbScore:.4f} (exact {exact}) in {time.time() - then:.2f} secs")
+    closePool()
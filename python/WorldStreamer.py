@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+
+# (c) 2015-2024, A Beloussov, D. Lafuze
+
+import collections
+import math
+import threading
+import time
+
+class WorldStreamer:
+    '''
+    Keeps the city chunks around the camera and the choppers resident and
+    drops the rest. update() runs on the main thread every frame: it hands
+    over the focus points, attaches at most ATTACH_PER_FRAME chunks the
+    loader thread has prepared and unloads what it asked to evict. The
+    loader thread wakes every IDLE_SECS, wants every chunk within loadDist
+    of a focus point, nearest first, and builds the missing ones off the
+    scene graph with CityChunks.prepare(), keeping at most READY_MAX of them
+    waiting so what it builds is never far out of date. Chunks farther than
+    unloadDist go, the gap between the two keeps a chunk on the edge from
+    flickering in and out. Resident chunks never add up to more than
+    budgetBytes: a nearer chunk evicts the farthest one, and if nothing is
+    farther the loader waits for the focus to move.
+    '''
+    TAG = "WorldStreamer"
+
+    LOAD_DIST = 1500.0
+    UNLOAD_DIST = 1800.0
+    PRELOAD_DIST = 600.0
+    BUDGET_MB = 256
+    ATTACH_PER_FRAME = 2
+    READY_MAX = 8
+    IDLE_SECS = 0.1
+
+    def __init__(self, main, chunks, loadDist = LOAD_DIST, unloadDist = UNLOAD_DIST, budgetBytes = None):
+        self.main = main
+        self.chunks = chunks
+        self.loadDist = loadDist
+        self.unloadDist = max(unloadDist, loadDist)
+        self.budgetBytes = int(self.BUDGET_MB * (1 << 20)) if budgetBytes is None else budgetBytes
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.focus = []
+        # key -> bytes of every chunk in the scene
+        self.resident = {}
+        # prepared on the loader thread, waiting for the main thread
+        self.ready = collections.deque()
+        self.pending = set()
+        self.evict = collections.deque()
+        self.evicting = set()
+        self.loaded = 0
+        self.unloaded = 0
+        self.overBudget = 0
+        self.prepared = 0
+        self.prepareSecs = 0.0
+        self.maxBytes = 0
+        self.quit = False
+        self.thread = None
+
+    def start(self, points):
+        # the loader thread must not be the first to touch the model loader
+        self.chunks.warmUp()
+        self.preload(points)
+        self.thread = threading.Thread(target = self.loadThread, name = "world-streamer", daemon = True)
+        self.thread.start()
+
+    def distance(self, key, focus):
+        cx, cy = self.chunks.centerOf(key)
+        return min(math.hypot(cx - x, cy - y) for x, y in focus)
+
+    def prepare(self, key):
+        then = time.perf_counter()
+        chunk = self.chunks.prepare(key)
+        with self.lock:
+            self.prepared += 1
+            self.prepareSecs += time.perf_counter() - then
+        return chunk
+
+    def preload(self, points):
+        # the chunks right around points, on the calling thread, so the
+        # first frame isn't an empty city; the loader thread does the rest
+        focus = [(pt[0], pt[1]) for pt in points]
+        with self.lock:
+            self.focus = focus
+        used = 0
+        for key in sorted(self.chunks.keysNear(focus, min(self.PRELOAD_DIST, self.loadDist)), key = lambda other: self.distance(other, focus)):
+            chunk = self.prepare(key)
+            if used + chunk.numBytes > self.budgetBytes:
+                chunk.cleanUp()
+                with self.lock:
+                    self.overBudget += 1
+                break
+            used += chunk.numBytes
+            self.main.attachChunk(chunk)
+            with self.lock:
+                self.resident[key] = chunk.numBytes
+                self.loaded += 1
+                self.maxBytes = max(self.maxBytes, used)
+
+    def update(self, points):
+        # main thread, once a frame
+        with self.lock:
+            self.focus = [(pt[0], pt[1]) for pt in points]
+            evict = list(self.evict)
+            self.evict.clear()
+            ready = [self.ready.popleft() for _ in range(min(self.ATTACH_PER_FRAME, len(self.ready)))]
+        if evict:
+            self.main.unloadChunks(evict)
+            with self.lock:
+                for key in evict:
+                    self.resident.pop(key, None)
+                    self.evicting.discard(key)
+                self.unloaded += len(evict)
+        for chunk in ready:
+            self.main.attachChunk(chunk)
+            with self.lock:
+                self.pending.discard(chunk.key)
+                self.resident[chunk.key] = chunk.numBytes
+                self.loaded += 1
+                self.maxBytes = max(self.maxBytes, sum(self.resident.values()))
+
+    def plan(self, focus):
+        # loader thread: queue evictions, then prepare what's missing
+        with self.lock:
+            staying = {key: size for key, size in self.resident.items() if key not in self.evicting}
+            for key in list(staying):
+                if self.distance(key, focus) > self.unloadDist:
+                    self.evict.append(key)
+                    self.evicting.add(key)
+                    del staying[key]
+            # evicted ones come back on a later pass, once they're gone
+            busy = set(self.pending) | set(self.evicting)
+            used = sum(staying.values()) + sum(chunk.numBytes for chunk in self.ready)
+        wanted = sorted(self.chunks.keysNear(focus, self.loadDist), key = lambda other: self.distance(other, focus))
+        farthest = sorted(staying, key = lambda other: self.distance(other, focus), reverse = True)
+        for key in wanted:
+            with self.lock:
+                backlog = len(self.ready) >= self.READY_MAX
+            if self.quit or backlog:
+                return
+            if key in staying or key in busy:
+                continue
+            near = self.distance(key, focus)
+            if used >= self.budgetBytes and not (farthest and self.distance(farthest[0], focus) > near):
+                # full and nothing to give up for it, don't build it for nothing
+                with self.lock:
+                    self.overBudget += 1
+                return
+            chunk = self.prepare(key)
+            with self.lock:
+                # make room by dropping resident chunks farther than this one
+                while used + chunk.numBytes > self.budgetBytes and farthest and self.distance(farthest[0], focus) > near:
+                    gone = farthest.pop(0)
+                    used -= staying.pop(gone)
+                    self.evict.append(gone)
+                    self.evicting.add(gone)
+                if used + chunk.numBytes > self.budgetBytes:
+                    self.overBudget += 1
+                    fits = False
+                else:
+                    used += chunk.numBytes
+                    self.ready.append(chunk)
+                    self.pending.add(key)
+                    fits = True
+            if not fits:
+                chunk.cleanUp()
+                return
+
+    def loadThread(self):
+        while not self.quit:
+            self.wake.wait(self.IDLE_SECS)
+            self.wake.clear()
+            with self.lock:
+                focus = list(self.focus)
+            if focus:
+                self.plan(focus)
+
+    def stats(self):
+        with self.lock:
+            return {"resident": len(self.resident),
+                    "residentMB": round(sum(self.resident.values()) / (1 << 20), 1),
+                    "maxMB": round(self.maxBytes / (1 << 20), 1),
+                    "ready": len(self.ready),
+                    "loaded": self.loaded,
+                    "unloaded": self.unloaded,
+                    "overBudget": self.overBudget,
+                    "prepareMsAvg": round(self.prepareSecs / self.prepared * 1e3, 2) if self.prepared else 0.0}
+
+    def close(self):
+        self.quit = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(5.0)
+        with self.lock:
+            ready = list(self.ready)
+            self.ready.clear()
+            self.pending.clear()
+        for chunk in ready:
+            chunk.cleanUp()